@@ -0,0 +1,133 @@
+"""Face index recall/latency benchmark.
+
+Builds synthetic galleries of people with several images each, matches
+fresh query images against them with exact search and with the IVF index
+at a range of n_probe settings, and prints one JSON document with recall
+(share of queries where the index returns the same identity as exact
+search) and per-frame match latency.
+
+    python -m benchmarks.ann_bench --output ann.json
+"""
+import argparse
+import json
+import os
+import time
+
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+os.environ.setdefault("WEATHER_API_KEY", "benchmark")
+os.environ.setdefault("DEGIRUM_API_KEY", "benchmark")
+os.environ.setdefault("FLASK_IP", "127.0.0.1")
+os.environ.setdefault("FLASK_PORT", "5000")
+
+import numpy as np  # noqa: E402
+from widgets.widget_handlers.facial_recognition.fr_files import (  # noqa: E402
+    FaceMatcher,
+    Gallery,
+    IvfIndex,
+)
+
+EMBEDDING_SIZE = 512
+IMAGES_PER_PERSON = 5
+# Spread of one person's images around their identity, relative to the
+# spread between identities. 0.8 gives a cosine similarity of about 0.6
+# between two images of one person, in line with ArcFace embeddings
+IMAGE_NOISE = 0.8
+FACES_PER_FRAME = 3
+
+
+def make_gallery(people, seed=0):
+    """Returns:
+        (np.ndarray, (str,), np.ndarray): Gallery rows, their names and the
+        identity centers
+    """
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(people, EMBEDDING_SIZE)).astype(np.float32)
+    rows = np.repeat(centers, IMAGES_PER_PERSON, axis=0)
+    rows += IMAGE_NOISE * rng.normal(size=rows.shape).astype(np.float32)
+    names = tuple(f"person{i}" for i in range(people) for _ in range(IMAGES_PER_PERSON))
+    return rows, names, centers
+
+
+def make_queries(centers, count, seed=1):
+    rng = np.random.default_rng(seed)
+    people = rng.integers(len(centers), size=count)
+    queries = centers[people] + IMAGE_NOISE * rng.normal(
+        size=(count, EMBEDDING_SIZE)
+    ).astype(np.float32)
+    return queries.reshape(-1, FACES_PER_FRAME, EMBEDDING_SIZE)
+
+
+def _time_matches(matcher, frames, gallery):
+    names = []
+    start = time.perf_counter()
+    for frame in frames:
+        names.extend(matcher.match_names(frame, gallery))
+    elapsed = time.perf_counter() - start
+    return names, elapsed / len(frames)
+
+
+def run(people, probes, queries, metric):
+    rows, names, centers = make_gallery(people)
+    frames = make_queries(centers, queries)
+    matcher = FaceMatcher(threshold=float("inf"), metric=metric)
+
+    exact_gallery = Gallery(rows, names, version=("exact",))
+    matcher.match_names(frames[0], exact_gallery)  # Warm the prepared gallery
+    exact_names, exact_latency = _time_matches(matcher, frames, exact_gallery)
+
+    start = time.perf_counter()
+    index = IvfIndex.train(rows, metric=metric)
+    train_seconds = time.perf_counter() - start
+
+    settings = []
+    for n_probe in probes:
+        index.n_probe = n_probe
+        gallery = Gallery(rows, names, version=("ivf", n_probe), index=index)
+        matcher.match_names(frames[0], gallery)
+        ann_names, latency = _time_matches(matcher, frames, gallery)
+        recall = np.mean([a == e for a, e in zip(ann_names, exact_names)])
+        settings.append(
+            {
+                "n_probe": n_probe,
+                "recall": float(recall),
+                "frame_ms": latency * 1000,
+                "speedup": exact_latency / latency,
+            }
+        )
+    return {
+        "people": people,
+        "rows": len(rows),
+        "n_lists": len(index.centroids),
+        "train_seconds": train_seconds,
+        "exact_frame_ms": exact_latency * 1000,
+        "ivf": settings,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--people", type=int, action="append")
+    parser.add_argument("--probe", type=int, action="append")
+    parser.add_argument("--queries", type=int, default=600)
+    parser.add_argument("--metric", choices=FaceMatcher.METRICS, default="l2")
+    parser.add_argument("--output", help="write JSON here instead of stdout")
+    args = parser.parse_args()
+
+    results = {
+        "faces_per_frame": FACES_PER_FRAME,
+        "metric": args.metric,
+        "galleries": [
+            run(people, args.probe or [1, 2, 4, 8, 16], args.queries, args.metric)
+            for people in args.people or [200, 500, 1000, 2000]
+        ],
+    }
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as output_file:
+            output_file.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
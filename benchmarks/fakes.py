@@ -0,0 +1,192 @@
+"""Stand-ins for the camera, the DeGirum models and the weather API, so the
+mirror can run headless on a machine without the hardware or network.
+"""
+import datetime
+import json
+import os
+import numpy as np
+from widgets.widget_handlers import WeatherClient, FacialRecognitionHandler
+from widgets.widget_handlers.facial_recognition.fr_files import HailoBackend
+
+EMBEDDING_SIZE = 512
+FRAME_SIZE = (640, 640)
+_FACE_SIZE = 120
+
+
+def _face_level(index):
+    """Gray level a person's face is painted with"""
+    return 40 + 30 * index
+
+
+def identity_embedding(index):
+    """Deterministic embedding for the person at roster index"""
+    rng = np.random.default_rng(index)
+    return rng.normal(size=EMBEDDING_SIZE)
+
+
+class FakeInferenceResult:
+
+    def __init__(self, results, image=None):
+        """Mimics the degirum result object: .results list and .image"""
+        self.results = results
+        self.image = image
+
+
+class FakeCamera:
+
+    def __init__(self, roster, size=FRAME_SIZE):
+        """Stand-in for Picamera2. Everyone in .people is painted into the
+        frame as a flat square face in their own gray level.
+
+        Args:
+            roster ([str,]): Every name the fake models know about
+            size ((int, int), optional): Frame width and height
+        """
+        self.roster = list(roster)
+        self.size = size
+        self.people = []
+
+    def face_bbox(self, name):
+        index = self.roster.index(name)
+        x1 = 20 + index * (_FACE_SIZE + 20)
+        y1 = 200
+        return [x1, y1, x1 + _FACE_SIZE, y1 + _FACE_SIZE]
+
+    def capture_array(self):
+        width, height = self.size
+        frame = np.zeros((height, width, 3), dtype=np.uint8)
+        for name in self.people:
+            x1, y1, x2, y2 = self.face_bbox(name)
+            frame[y1:y2, x1:x2] = _face_level(self.roster.index(name))
+        return frame
+
+    def capture_file(self, path):
+        return False
+
+    def close(self):
+        None
+
+
+class FakeDetectModel:
+
+    def __init__(self, camera):
+        """Stand-in for the SCRFD model, reports the faces FakeCamera painted"""
+        self.camera = camera
+
+    def __call__(self, frame):
+        results = [
+            {"bbox": self.camera.face_bbox(name), "score": 0.9, "label": "face"}
+            for name in self.camera.people
+        ]
+        return FakeInferenceResult(results, image=frame)
+
+
+class FakeRecogModel:
+
+    def __init__(self, roster):
+        """Stand-in for the ArcFace model, maps a crop's gray level back to
+        the embedding of the person painted with it
+        """
+        self._levels = {_face_level(index): index for index in range(len(roster))}
+
+    def __call__(self, face):
+        level = int(round(float(np.mean(face))))
+        index = self._levels.get(level)
+        if index is not None:
+            embedding = identity_embedding(index)
+        else:
+            embedding = identity_embedding(10_000 + level)
+        return FakeInferenceResult([{"data": [embedding.tolist()]}])
+
+    def predict_batch(self, faces):
+        """Mimics degirum's predict_batch: yields one result per input"""
+        for face in faces:
+            yield self(face)
+
+
+class ManualFacialRecHandler(FacialRecognitionHandler):
+    """Recognition handler whose passes are run by the caller instead of a
+    background thread, so scenarios are deterministic
+    """
+
+    def start_in_frame_thread(self):
+        self._ensure_known_faces()
+        return None
+
+    def step(self):
+        """Run one capture, detect, recognize and publish pass, as the
+        pipeline does for each frame
+        """
+        frame = self.picam2.capture_array()
+        self._publish_tracked_names(self._recognize(self._detect(frame)))
+
+
+def make_facial_rec_handler(roster, work_dir):
+    """Build a recognition handler on the fake camera and models with a
+    gallery of one embedding per roster name
+
+    Returns:
+        (ManualFacialRecHandler, FakeCamera)
+    """
+    camera = FakeCamera(roster)
+    handler = ManualFacialRecHandler(
+        picam2=camera,
+        backend=HailoBackend(FakeDetectModel(camera), FakeRecogModel(roster)),
+        store_dir=os.path.join(work_dir, "known_faces_store"),
+    )
+    # A face leaves on the first pass without it, so scenarios do not have
+    # to step through the tracker's grace period
+    handler.tracker.max_misses = 0
+    handler.facial_recognition.store.rewrite(
+        np.array([identity_embedding(index) for index in range(len(roster))]),
+        list(roster),
+        [None] * len(roster),
+        [None] * len(roster),
+        # Stands in for the Hailo model, so the store is not relearned
+        model=handler.backend.model_name,
+    )
+    return handler, camera
+
+
+def make_forecast(temp_f=64, code=1003, days=5):
+    """Forecast JSON in the weatherapi.com shape WeatherClient reads"""
+    today = datetime.date.today()
+    forecast_days = []
+    for offset in range(days):
+        forecast_days.append(
+            {
+                "date": str(today + datetime.timedelta(days=offset)),
+                "day": {
+                    "maxtemp_f": temp_f + 6 + offset,
+                    "mintemp_f": temp_f - 10 + offset,
+                    "avgtemp_f": temp_f + offset,
+                    "condition": {"code": code},
+                },
+            }
+        )
+    return {
+        "location": {"name": "Haverstraw", "region": "New York"},
+        "current": {"is_day": 1, "temp_f": temp_f, "condition": {"code": code}},
+        "forecast": {"forecastday": forecast_days},
+    }
+
+
+def make_weather_client(work_dir, temp_f=64):
+    """Build a WeatherClient that reads and writes forecast.json in work_dir
+    and gets its 'API responses' from make_forecast
+
+    Returns:
+        WeatherClient: Client with a settable .temp_f for the next refresh
+    """
+
+    class FakeWeatherClient(WeatherClient):
+        _FORECAST_JSON = os.path.join(work_dir, "forecast.json")
+
+        def _request_weather(self, url_func):
+            return make_forecast(temp_f=self.temp_f)
+
+    with open(FakeWeatherClient._FORECAST_JSON, "w") as json_file:
+        json.dump(make_forecast(temp_f=temp_f), json_file)
+    client = FakeWeatherClient()
+    client.temp_f = temp_f
+    return client
@@ -0,0 +1,311 @@
+"""Offline recognition benchmark.
+
+Enrolls a labelled gallery and replays labelled probe images or videos
+through FacialRecognition's detect, crop, encode and match path, then
+prints one JSON document with per-stage latency percentiles, frames per
+second, and precision/recall over a sweep of match thresholds.
+
+Dataset layout (the gallery is laid out like known_faces):
+
+    dataset/gallery/<name>/*.jpg        enrollment images
+    dataset/probes/<label>/*.jpg|*.mp4  frames of <label>, any label not
+                                        in the gallery is a stranger
+
+Without --dataset a synthetic dataset for the stub backend is generated.
+
+    python -m benchmarks.recognition_bench --backend stub --output rec.json
+    python -m benchmarks.recognition_bench --backend cpu --dataset ~/faces
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+os.environ.setdefault("WEATHER_API_KEY", "benchmark")
+os.environ.setdefault("DEGIRUM_API_KEY", "benchmark")
+os.environ.setdefault("FLASK_IP", "127.0.0.1")
+os.environ.setdefault("FLASK_PORT", "5000")
+
+import cv2  # noqa: E402
+import numpy as np  # noqa: E402
+from widgets.widget_handlers.facial_recognition.fr_files import (  # noqa: E402
+    FaceMatcher,
+    FacialRecognition,
+    ImageDirSource,
+    VideoFileSource,
+    make_backend,
+)
+
+STAGES = ("detect", "crop", "encode", "match", "total")
+VIDEO_EXTENSIONS = (".mp4", ".avi", ".mov", ".mkv", ".h264")
+
+# Synthetic dataset: stub faces are flat squares whose gray level is the
+# identity, so levels sit in the middle of the stub's 16-level buckets
+SYNTHETIC_KNOWN_LEVELS = (48, 80, 112, 144, 176)
+SYNTHETIC_STRANGER_LEVELS = (208, 240)
+SYNTHETIC_FRAME_SIZE = (640, 480)
+
+
+def _percentiles(values):
+    if not values:
+        return {"p50": 0.0, "p95": 0.0, "p99": 0.0, "mean": 0.0}
+    ordered = sorted(values)
+
+    def pick(quantile):
+        return ordered[min(int(quantile * len(ordered)), len(ordered) - 1)]
+
+    return {
+        "p50": pick(0.5),
+        "p95": pick(0.95),
+        "p99": pick(0.99),
+        "mean": sum(ordered) / len(ordered),
+    }
+
+
+# -- Dataset -- #
+def _synthetic_frame(rng, level):
+    width, height = SYNTHETIC_FRAME_SIZE
+    frame = rng.integers(0, 8, size=(height, width, 3), dtype=np.uint8)
+    side = int(rng.integers(80, 200))
+    x = int(rng.integers(0, width - side))
+    y = int(rng.integers(0, height - side))
+    frame[y:y + side, x:x + side] = level + rng.integers(-4, 5)
+    return frame
+
+
+def make_synthetic_dataset(root, images_per_person=3, probes_per_person=20, seed=0):
+    """Write a stub-backend dataset under root
+
+    Returns:
+        Path: The dataset directory
+    """
+    rng = np.random.default_rng(seed)
+    for i, level in enumerate(SYNTHETIC_KNOWN_LEVELS):
+        name = f"person{i}"
+        gallery_dir = os.path.join(root, "gallery", name)
+        os.makedirs(gallery_dir)
+        for j in range(images_per_person):
+            cv2.imwrite(
+                os.path.join(gallery_dir, f"{name}_scan{j}.jpg"), _synthetic_frame(rng, level)
+            )
+    probe_levels = [(f"person{i}", level) for i, level in enumerate(SYNTHETIC_KNOWN_LEVELS)]
+    probe_levels += [
+        (f"stranger{i}", level) for i, level in enumerate(SYNTHETIC_STRANGER_LEVELS)
+    ]
+    for label, level in probe_levels:
+        probe_dir = os.path.join(root, "probes", label)
+        os.makedirs(probe_dir)
+        for j in range(probes_per_person):
+            cv2.imwrite(os.path.join(probe_dir, f"{j:04d}.png"), _synthetic_frame(rng, level))
+    return root
+
+
+def iter_probes(probe_root, frame_step=1):
+    """Yields:
+        (str, np.ndarray): Label and frame of every probe image, and of every
+        frame_step-th frame of every probe video
+    """
+    for label in sorted(os.listdir(probe_root)):
+        label_dir = os.path.join(probe_root, label)
+        if not os.path.isdir(label_dir):
+            continue
+        try:
+            source = ImageDirSource(label_dir, loop=False)
+        except ValueError:
+            source = None
+        while source is not None:
+            frame = source.read()
+            if frame is None:
+                break
+            yield label, frame
+        for filename in sorted(os.listdir(label_dir)):
+            if not filename.lower().endswith(VIDEO_EXTENSIONS):
+                continue
+            source = VideoFileSource(os.path.join(label_dir, filename), loop=False)
+            try:
+                frame_num = 0
+                while True:
+                    frame = source.read()
+                    if frame is None:
+                        break
+                    if frame_num % frame_step == 0:
+                        yield label, frame
+                    frame_num += 1
+            finally:
+                source.close()
+
+
+# -- Replay -- #
+def replay(facial_recognition, gallery, probes):
+    """Run every probe frame through the recognition path
+
+    Only the largest face of a frame is scored against its label. The
+    matcher keeps the nearest identity whatever its distance, so every
+    threshold can be scored afterwards.
+
+    Returns:
+        ({str: [float,]}, [(str, str, float),]): Milliseconds of each stage
+        per frame, and (label, nearest name, distance) per frame, name None
+        when no face was found
+    """
+    matcher = FaceMatcher(
+        threshold=float("inf"),
+        metric=facial_recognition.matcher.metric,
+        aggregation=facial_recognition.matcher.aggregation,
+        top_k=facial_recognition.matcher.top_k,
+    )
+    timings = {stage: [] for stage in STAGES}
+    scores = []
+    for label, frame in probes:
+        start = time.perf_counter()
+        bboxes, landmarks = facial_recognition.locate_faces(frame)
+        detected = time.perf_counter()
+        batch = facial_recognition.prepare_faces(frame, bboxes, landmarks)
+        cropped = time.perf_counter()
+        try:
+            encodings = facial_recognition._encode_faces(batch.faces)
+        finally:
+            batch.release()
+        encoded = time.perf_counter()
+        found = [
+            (bboxes[box_index], encoding)
+            for box_index, encoding in zip(batch.indexes, encodings)
+            if encoding is not None
+        ]
+        matches = matcher.match([encoding for _, encoding in found], gallery)
+        matched = time.perf_counter()
+
+        spans = (
+            (start, detected),
+            (detected, cropped),
+            (cropped, encoded),
+            (encoded, matched),
+            (start, matched),
+        )
+        for stage, (begin, end) in zip(STAGES, spans):
+            timings[stage].append((end - begin) * 1000)
+        if matches:
+            areas = [(x2 - x1) * (y2 - y1) for (x1, y1, x2, y2), _ in found]
+            best = matches[int(np.argmax(areas))]
+            scores.append((label, best.name, best.distance))
+        else:
+            scores.append((label, None, float("inf")))
+    return timings, scores
+
+
+def sweep(scores, known_names, thresholds):
+    """Precision and recall at each threshold
+
+    A frame is accepted when its nearest identity is under the threshold,
+    as FaceMatcher decides.
+    Precision is the share of accepted frames given the right name, recall
+    the share of frames of enrolled people given the right name, and the
+    false accept rate the share of stranger frames given any name.
+    """
+    known = [score for score in scores if score[0] in known_names]
+    strangers = [score for score in scores if score[0] not in known_names]
+    results = []
+    for threshold in thresholds:
+        accepted = [score for score in scores if score[1] is not None and score[2] < threshold]
+        correct = sum(1 for label, name, _ in accepted if name == label)
+        precision = correct / len(accepted) if accepted else 1.0
+        recall = correct / len(known) if known else 0.0
+        false_accepts = sum(
+            1 for label, name, distance in strangers if name is not None and distance < threshold
+        )
+        results.append(
+            {
+                "threshold": float(threshold),
+                "precision": precision,
+                "recall": recall,
+                "f1": 2 * precision * recall / (precision + recall) if precision + recall else 0.0,
+                "false_accept_rate": false_accepts / len(strangers) if strangers else 0.0,
+            }
+        )
+    return results
+
+
+def _default_thresholds(scores, current, steps=20):
+    distances = [distance for _, name, distance in scores if name is not None]
+    top = max(distances + [current]) * 1.1 if distances else current * 2
+    return sorted(set(np.linspace(0.0, top, steps + 1).round(4).tolist() + [current]))
+
+
+def run(backend_name, dataset, frame_step=1, thresholds=None):
+    """Enroll the gallery, replay the probes and return the results dict"""
+    work_dir = tempfile.mkdtemp(prefix="recognition_bench_")
+    if dataset is None:
+        dataset = make_synthetic_dataset(os.path.join(work_dir, "dataset"))
+    # A json_path that does not exist keeps the repo's legacy known faces
+    # out of the benchmark gallery
+    facial_recognition = FacialRecognition(
+        None,
+        store_dir=os.path.join(work_dir, "store"),
+        backend=make_backend(backend_name),
+        json_path=os.path.join(work_dir, "known_faces.json"),
+    )
+    facial_recognition._FACE_PIC_DIR = os.path.join(dataset, "gallery")
+    try:
+        start = time.perf_counter()
+        facial_recognition.learn_new_faces()
+        enrollment_seconds = time.perf_counter() - start
+        gallery = facial_recognition._get_gallery()
+
+        # Warm the models and inference workers outside the timed frames
+        probes = iter_probes(os.path.join(dataset, "probes"), frame_step)
+        warm_label, warm_frame = next(probes)
+        replay(facial_recognition, gallery, [(warm_label, warm_frame)])
+        timings, scores = replay(
+            facial_recognition, gallery, [(warm_label, warm_frame)] + list(probes)
+        )
+    finally:
+        facial_recognition.close()
+
+    current = facial_recognition.matcher.threshold
+    known_names = set(gallery.names)
+    sweep_results = sweep(
+        scores, known_names, thresholds or _default_thresholds(scores, current)
+    )
+    total_seconds = sum(timings["total"]) / 1000
+    return {
+        "backend": backend_name,
+        "model": facial_recognition.backend.model_name,
+        "dataset": dataset,
+        "gallery_people": len(known_names),
+        "gallery_images": len(gallery),
+        "enrollment_seconds": enrollment_seconds,
+        "frames": len(scores),
+        "frames_without_face": sum(1 for _, name, _ in scores if name is None),
+        "fps": len(scores) / total_seconds if total_seconds else 0.0,
+        "stage_ms": {stage: _percentiles(timings[stage]) for stage in STAGES},
+        "current_threshold": current,
+        "current": next(
+            (result for result in sweep_results if result["threshold"] == current), None
+        ),
+        "best_f1_threshold": max(sweep_results, key=lambda result: result["f1"])["threshold"],
+        "thresholds": sweep_results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--backend", choices=("stub", "cpu", "hailo"), default="stub")
+    parser.add_argument("--dataset", help="labelled dataset directory, synthetic if not given")
+    parser.add_argument("--frame-step", type=int, default=1, help="use every n-th video frame")
+    parser.add_argument("--threshold", type=float, action="append", help="threshold to score")
+    parser.add_argument("--output", help="write JSON here instead of stdout")
+    args = parser.parse_args()
+
+    results = run(args.backend, args.dataset, args.frame_step, args.threshold)
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as output_file:
+            output_file.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
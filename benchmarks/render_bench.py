@@ -0,0 +1,220 @@
+"""Headless rendering benchmark.
+
+Runs SmartMirror and Widgets under the SDL dummy video driver with the fake
+camera, models and weather from benchmarks.fakes, and prints one JSON
+document with per-scenario frame rate, CPU time, allocation and memory
+figures so runs can be compared between commits.
+
+    python -m benchmarks.render_bench --output bench.json
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+os.environ.setdefault("WEATHER_API_KEY", "benchmark")
+os.environ.setdefault("DEGIRUM_API_KEY", "benchmark")
+os.environ.setdefault("FLASK_IP", "127.0.0.1")
+os.environ.setdefault("FLASK_PORT", "5000")
+
+import pygame  # noqa: E402
+from main import SmartMirror  # noqa: E402
+from widgets import FrameStats  # noqa: E402
+from benchmarks.fakes import make_facial_rec_handler, make_weather_client  # noqa: E402
+
+ROSTER = ["alice", "bob"]
+ACTIVE_STEP = 1 / SmartMirror._ACTIVE_FPS
+IDLE_STEP = 1 / SmartMirror._IDLE_FPS
+
+
+class SimulatedClock:
+
+    def __init__(self):
+        """Monotonic clock the benchmark advances by hand, one frame at a
+        time, so fades take the same number of frames on every machine
+        """
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+# -- Scenarios: people in frame while settling, then an action at frame 0 -- #
+def _set_people(env, people):
+    env["camera"].people = list(people)
+    env["handler"].step()
+
+
+def _refresh_weather(env):
+    env["weather_client"].temp_f += 7
+    env["weather_client"]._request_and_save_weather(
+        env["weather_client"]._get_forecast_url
+    )
+
+
+SCENARIOS = {
+    "empty_room": {"setup": [], "action": None},
+    "person_arriving": {"setup": [], "action": lambda env: _set_people(env, ["alice"])},
+    "fade_out": {"setup": ["alice"], "action": lambda env: _set_people(env, [])},
+    "weather_refresh": {"setup": [], "action": _refresh_weather},
+}
+
+
+def _percentiles(values):
+    if not values:
+        return {"p50": 0.0, "p95": 0.0, "p99": 0.0, "mean": 0.0}
+    ordered = sorted(values)
+
+    def pick(quantile):
+        return ordered[min(int(quantile * len(ordered)), len(ordered) - 1)]
+
+    return {
+        "p50": pick(0.5),
+        "p95": pick(0.95),
+        "p99": pick(0.99),
+        "mean": sum(ordered) / len(ordered),
+    }
+
+
+def _draw_frame(mirror, clock):
+    mirror._draw_screen()
+    clock.advance(ACTIVE_STEP if mirror.widgets.is_animating() else IDLE_STEP)
+
+
+def _prepare(mirror, env, clock, scenario):
+    """Apply the scenario's starting state and draw until every fade settled"""
+    _set_people(env, scenario["setup"])
+    for _ in range(10 * SmartMirror._ACTIVE_FPS):
+        _draw_frame(mirror, clock)
+        if not mirror.widgets.is_animating():
+            break
+    mirror.renderer.invalidate()
+    _draw_frame(mirror, clock)
+    if scenario["action"]:
+        scenario["action"](env)
+
+
+def _time_scenario(mirror, env, clock, scenario, frames):
+    _prepare(mirror, env, clock, scenario)
+    frame_stats = FrameStats(frame_budget=ACTIVE_STEP)
+    mirror.frame_stats = mirror.renderer.frame_stats = frame_stats
+    frame_ms = []
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    for _ in range(frames):
+        frame_start = time.perf_counter()
+        _draw_frame(mirror, clock)
+        frame_ms.append((time.perf_counter() - frame_start) * 1000)
+    wall = time.perf_counter() - wall_start
+    cpu = time.process_time() - cpu_start
+    stages = {
+        name: {key: stage[key] * 1000 for key in ("p50", "p95", "p99")}
+        for name, stage in frame_stats.snapshot()["stages"].items()
+    }
+    return {
+        "frames": frames,
+        "fps": frames / wall if wall else 0.0,
+        "frame_ms": _percentiles(frame_ms),
+        "cpu_ms_per_frame": cpu * 1000 / frames,
+        "stage_ms": stages,
+    }
+
+
+def _alloc_scenario(mirror, env, clock, scenario, frames):
+    _prepare(mirror, env, clock, scenario)
+    peak_kib = []
+    blocks_start = sys.getallocatedblocks()
+    tracemalloc.start()
+    for _ in range(frames):
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        _draw_frame(mirror, clock)
+        peak_kib.append((tracemalloc.get_traced_memory()[1] - current) / 1024)
+    tracemalloc.stop()
+    return {
+        "alloc_peak_kib_per_frame": _percentiles(peak_kib),
+        "net_blocks_per_frame": (sys.getallocatedblocks() - blocks_start) / frames,
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(scenario_names, frames, screen_size, trace_alloc=True):
+    """Run the scenarios and return the results dict"""
+    work_dir = tempfile.mkdtemp(prefix="mirror_bench_")
+    handler, camera = make_facial_rec_handler(ROSTER, work_dir)
+    weather_client = make_weather_client(work_dir)
+    mirror = SmartMirror(
+        weather_client=weather_client,
+        facial_rec_handler=handler,
+        screen_size=screen_size,
+        start_flask=False,
+    )
+    clock = SimulatedClock()
+    mirror.widgets.animator.clock = clock
+    env = {"camera": camera, "handler": handler, "weather_client": weather_client}
+
+    results = {}
+    for name in scenario_names:
+        scenario = SCENARIOS[name]
+        results[name] = _time_scenario(mirror, env, clock, scenario, frames)
+        if trace_alloc:
+            results[name].update(_alloc_scenario(mirror, env, clock, scenario, frames))
+        results[name]["peak_rss_kib"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    return {
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "pygame": pygame.version.ver,
+        "machine": platform.machine(),
+        "screen_size": list(mirror.screen_rect.size),
+        "frames_per_scenario": frames,
+        "scenarios": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS))
+    parser.add_argument("--frames", type=int, default=300)
+    parser.add_argument("--width", type=int, default=3840)
+    parser.add_argument("--height", type=int, default=2160)
+    parser.add_argument("--no-alloc", action="store_true", help="skip the tracemalloc pass")
+    parser.add_argument("--output", help="write JSON here instead of stdout")
+    args = parser.parse_args()
+
+    results = run(
+        args.scenario or list(SCENARIOS),
+        args.frames,
+        (args.width, args.height),
+        trace_alloc=not args.no_alloc,
+    )
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as output_file:
+            output_file.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
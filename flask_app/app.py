@@ -1,4 +1,4 @@
-from flask import Flask, url_for, redirect, render_template, request
+from flask import Flask, url_for, redirect, render_template, request, jsonify, Response
 from decouple import config
 import threading
 
@@ -15,11 +15,28 @@ def shutdown_flask_server():
         raise RuntimeError('Not running with the Werkzeug Server')
     func()
 
+@app.get('/metrics')
+def frame_metrics():
+    frame_stats = app.config.get('FRAME_STATS')
+    if frame_stats is None:
+        return Response("", mimetype='text/plain')
+    return Response(
+        frame_stats.to_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8'
+    )
+
+@app.get('/metrics.json')
+def frame_metrics_json():
+    frame_stats = app.config.get('FRAME_STATS')
+    if frame_stats is None:
+        return jsonify({})
+    return jsonify(frame_stats.snapshot())
+
 def _run_flask():
     app.run(host=config("FLASK_IP"), port=config("FLASK_PORT"), debug=True, use_reloader=False)
     print("Flask Server Shutting Down")
 
-def start_flask_thread():
+def start_flask_thread(frame_stats=None):
+    app.config['FRAME_STATS'] = frame_stats
     flask_thread = threading.Thread(
         target=_run_flask,
         daemon=True
@@ -1,5 +1,13 @@
+import time
+
+# Startup timeline origin, before the heavy imports
+_BOOT_TIME = time.perf_counter()
+
 import pygame
-from widgets import Widgets
+import datetime
+from widgets import Widgets, ImageCache, DirtyRectRenderer, FrameStats, Startup
+from widgets.events import STARTUP_READY, post_wakeup
+from widgets.widget_handlers import add_startup_tasks
 import gc
 import flask_app
 from decouple import config
@@ -11,31 +19,100 @@ import signal
 running = True
 
 class SmartMirror:
+    _ACTIVE_FPS = 30
+    _IDLE_FPS = 1
 
     pygame.init()
     pygame.font.init()
 
-    def __init__(self):
+    def __init__(
+        self,
+        weather_client=None,
+        facial_rec_handler=None,
+        screen_size=(0, 0),
+        start_flask=True,
+    ):
         """Class to run main Smart Mirror logic
+
+        The clock is drawn straight away. Handlers that are not given are
+        built in the background by a Startup, and their widgets appear as
+        they become ready.
+
+        Args:
+            weather_client (WeatherClient, optional): Defaults to the shared
+                client, built in the background
+            facial_rec_handler (FacialRecognitionHandler, optional): Defaults
+                to the shared handler, built in the background
+            screen_size ((int, int), optional): Display size, (0, 0) goes
+                fullscreen at the current resolution, anything else opens a
+                window of that size. Defaults to (0, 0).
+            start_flask (bool, optional): Start the Flask server. Defaults to True.
         """
-        self.screen = pygame.display.set_mode((0, 0), pygame.FULLSCREEN)
+        self.startup = Startup(
+            on_ready=lambda name: post_wakeup(STARTUP_READY), start=_BOOT_TIME
+        )
+        add_startup_tasks(
+            self.startup,
+            weather=weather_client is None,
+            facial_recognition=facial_rec_handler is None,
+        )
+        self.startup.start()
+        display_flags = pygame.FULLSCREEN if tuple(screen_size) == (0, 0) else 0
+        self.screen = pygame.display.set_mode(screen_size, display_flags)
         pygame.mouse.set_visible(False)
-        flask_app.start_flask_thread()
+        self.startup.mark("display")
+        self.frame_stats = FrameStats(frame_budget=1 / self._ACTIVE_FPS)
+        if start_flask:
+            flask_app.start_flask_thread(frame_stats=self.frame_stats)
         self.screen_rect = self.screen.get_rect()
         self.clock = pygame.time.Clock()
-        self.widgets = Widgets(self)
+        self.image_cache = ImageCache()
+        self.widgets = Widgets(
+            self, weather_client=weather_client, facial_rec_handler=facial_rec_handler
+        )
+        self.renderer = DirtyRectRenderer(
+            self.screen,
+            dirty_rects=config("DIRTY_RECTS", default=True, cast=bool),
+            frame_stats=self.frame_stats,
+        )
         self._shutdown_called = False
 
     def _check_events(self):
-        None
+        # Wake-up events only need to end the idle wait, drain them here
+        pygame.event.pump()
+        pygame.event.clear()
+
+    def _wait_for_wakeup(self):
+        """Sleeps until the next clock second, or until a background thread
+        posts a wake-up event
+        """
+        idle_ms = 1000 // self._IDLE_FPS
+        now = datetime.datetime.now()
+        timeout = idle_ms - (now.microsecond // 1000) % idle_ms
+        pygame.event.wait(timeout=timeout)
+        self.clock.tick()
+
+    def _attach_ready(self):
+        """Hand handlers that finished starting up to the widgets"""
+        for name, result in self.startup.poll():
+            if name == "weather":
+                self.widgets.attach_weather_client(result)
+            elif name == "facial_recognition":
+                self.widgets.attach_facial_rec_handler(result)
 
     def _draw_screen(self):
-        """Takes widgets from _to_draw and blits them screen
+        """Takes widgets from _to_draw and blits the regions that changed
+        since the last frame to the screen
         """
-        self.screen.fill((0, 0, 0))
-        self.widgets.create_and_place()
-        self.screen.blits(blit_sequence=self.widgets.screen_objects())
-        pygame.display.flip()
+        self._attach_ready()
+        frame_start = time.perf_counter()
+        with self.frame_stats.time("create_and_place"):
+            self.widgets.create_and_place()
+        self.renderer.draw(
+            self.widgets.screen_objects(), animating=self.widgets.is_animating()
+        )
+        self.frame_stats.record_frame(time.perf_counter() - frame_start)
+        self.startup.mark("first_frame")
 
     def _shutdown(self):
         if self._shutdown_called:
@@ -52,18 +129,23 @@ class SmartMirror:
             print(f"Error shutting down Flask server: {e}")
             # Potentially try a more forceful shutdown if necessary
 
-        self.widgets.facial_rec_handler.stop_event.set()
-        if hasattr(self.widgets, 'facial_rec_thread') and self.widgets.facial_rec_thread.is_alive():
-            print("Waiting for facial recognition thread to finish...")
-            self.widgets.facial_rec_thread.join()  # Add a timeout to prevent indefinite blocking
-        print("Facial Recognition Thread Terminated.")
-
-        print("Releasing camera resources...")
-        try:
-            self.widgets.facial_rec_handler.picam2.close()
-            print("Camera resources released.")
-        except Exception as e:
-            print(f"Error closing Picamera2: {e}")
+        facial_rec_handler = self.widgets.facial_rec_handler
+        if facial_rec_handler is None:
+            print("Facial recognition never started.")
+        else:
+            facial_rec_handler.stop_event.set()
+            if self.widgets.facial_rec_thread and self.widgets.facial_rec_thread.is_alive():
+                print("Waiting for facial recognition thread to finish...")
+                self.widgets.facial_rec_thread.join()  # Add a timeout to prevent indefinite blocking
+            print("Facial Recognition Thread Terminated.")
+            facial_rec_handler.facial_recognition.close()
+
+            print("Releasing camera resources...")
+            try:
+                facial_rec_handler.picam2.close()
+                print("Camera resources released.")
+            except Exception as e:
+                print(f"Error closing Picamera2: {e}")
 
         print('Closing Pygame')
         pygame.quit()
@@ -76,26 +158,37 @@ class SmartMirror:
         return pygame.font.Font(font_path, font_size)
 
     def import_image(self, icon_path, size=80):
-        """Takes image path from Widgets and imports into pygame
+        """Takes image path from Widgets and returns it from the image cache,
+        importing it into pygame on the first use
 
         Args:
             icon_path (Path): Path() to the current icon.png file
 
         Returns:
-            Surface: Pygame surface of the icon
+            Surface: Pygame surface of the icon, shared with the cache
+        """
+        return self.image_cache.get(icon_path, size)
+
+    def preload_images(self, icon_dir, sizes):
+        """Imports every icon in icon_dir ahead of the first frame
+
+        Args:
+            icon_dir (Path): Directory of .png icons
+            sizes ((int,)): Sizes the icons are drawn at
         """
-        icon = pygame.image.load(icon_path)
-        if size:
-            icon = pygame.transform.scale(icon, (size, size))
-        return icon
+        self.image_cache.preload(icon_dir, sizes)
 
     def run_program(self):
-        """Runs the main loop of the Smart Mirror application
+        """Runs the main loop of the Smart Mirror application. Ticks at full
+        rate while a fade is running and idles otherwise
         """
         while running:
             self._check_events()
             self._draw_screen()
-            self.clock.tick(30)  
+            if self.widgets.is_animating():
+                self.clock.tick(self._ACTIVE_FPS)
+            else:
+                self._wait_for_wakeup()
 
 
 
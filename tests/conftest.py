@@ -0,0 +1,10 @@
+import os
+
+# The widgets package reads these at import, give it harmless values so the
+# tests need no .env, display, camera or network
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("WEATHER_API_KEY", "test")
+os.environ.setdefault("DEGIRUM_API_KEY", "test")
+os.environ.setdefault("FLASK_IP", "127.0.0.1")
+os.environ.setdefault("FLASK_PORT", "5000")
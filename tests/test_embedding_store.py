@@ -0,0 +1,47 @@
+import json
+import numpy as np
+from widgets.widget_handlers.facial_recognition.fr_files import EmbeddingStore
+
+
+def _write_legacy(path, names, encodings):
+    with open(path, "w") as json_file:
+        json.dump({"known_names": names, "known_encodings": encodings}, json_file)
+
+
+def test_migrate_from_empty_legacy_json_is_skipped(tmp_path):
+    json_path = tmp_path / "known_faces.json"
+    _write_legacy(json_path, [], [])
+    store = EmbeddingStore(str(tmp_path / "store"))
+
+    assert store.migrate_from_json(str(json_path), model="m") is False
+    assert not store.exists()
+
+
+def test_migrate_from_legacy_json(tmp_path):
+    json_path = tmp_path / "known_faces.json"
+    _write_legacy(json_path, ["ann", "ben"], [[1.0, 2.0], [3.0, 4.0]])
+    store = EmbeddingStore(str(tmp_path / "store"))
+
+    assert store.migrate_from_json(str(json_path), model="m") is True
+    encodings, index, header = store.load()
+    np.testing.assert_array_equal(encodings, [[1.0, 2.0], [3.0, 4.0]])
+    assert [entry["name"] for entry in index] == ["ann", "ben"]
+    assert header["model"] == "m"
+
+
+def test_append_after_empty_rewrite(tmp_path):
+    # The first enrollment pass may encode no face at all
+    store = EmbeddingStore(str(tmp_path / "store"))
+    store.rewrite(np.zeros((0, 0), dtype=np.float32), [], [], [], model="m")
+    assert store.read_header()["dim"] is None
+
+    store.append(np.ones((1, 128), dtype=np.float32), ["ann"], ["h"], ["ann.jpg"], model="m")
+    encodings, index, header = store.load()
+    assert encodings.shape == (1, 128)
+    assert [entry["name"] for entry in index] == ["ann"]
+    assert header["dim"] == 128
+
+    store.append(np.zeros((1, 128), dtype=np.float32), ["ben"], ["h2"], ["ben.jpg"], model="m")
+    encodings, index, _ = store.load()
+    assert encodings.shape == (2, 128)
+    assert [entry["name"] for entry in index] == ["ann", "ben"]
@@ -0,0 +1,60 @@
+import cv2
+import numpy as np
+import pytest
+from widgets.widget_handlers.facial_recognition.fr_files import (
+    EmbeddingStore,
+    FacialRecognition,
+    StubBackend,
+)
+
+
+def _save_face(known_faces_dir, name, level):
+    person_dir = known_faces_dir / name
+    person_dir.mkdir(parents=True)
+    frame = np.zeros((120, 160, 3), dtype=np.uint8)
+    frame[30:90, 50:110] = level
+    cv2.imwrite(str(person_dir / f"{name}_scan0.jpg"), frame)
+
+
+@pytest.fixture
+def facial_recognition(tmp_path):
+    _save_face(tmp_path / "known_faces", "ann", 96)
+    facial_recognition = FacialRecognition(
+        None,
+        store_dir=str(tmp_path / "store"),
+        backend=StubBackend(),
+        json_path=str(tmp_path / "known_faces.json"),
+    )
+    facial_recognition._FACE_PIC_DIR = str(tmp_path / "known_faces")
+    yield facial_recognition
+    facial_recognition.close()
+
+
+@pytest.mark.parametrize("rows", [0, 2])
+def test_learn_new_faces_relearns_a_store_of_another_model(tmp_path, facial_recognition, rows):
+    EmbeddingStore(str(tmp_path / "store")).rewrite(
+        np.ones((rows, 4), dtype=np.float32),
+        ["old"] * rows,
+        [None] * rows,
+        [None] * rows,
+        model="other_model",
+    )
+
+    facial_recognition.learn_new_faces()
+
+    encodings, index, header = facial_recognition.store.load()
+    assert header["model"] == StubBackend.model_name
+    assert [entry["name"] for entry in index] == ["ann"]
+    assert encodings.shape == (1, 128)
+
+
+def test_learn_new_faces_appends_only_new_images(tmp_path, facial_recognition):
+    facial_recognition.learn_new_faces()
+    generation = facial_recognition.store.read_header()["generation"]
+    _save_face(tmp_path / "known_faces", "ben", 160)
+
+    facial_recognition.learn_new_faces()
+
+    _, index, header = facial_recognition.store.load()
+    assert [entry["name"] for entry in index] == ["ann", "ben"]
+    assert header["generation"] == generation
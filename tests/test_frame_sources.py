@@ -0,0 +1,24 @@
+import numpy as np
+from widgets.widget_handlers.facial_recognition.fr_files import FrameRing, Picamera2Source
+
+
+class _Camera:
+
+    def __init__(self):
+        self.frames = []
+
+    def capture_array(self):
+        self.frames.append(np.zeros((4, 4, 3), dtype=np.uint8))
+        return self.frames[-1]
+
+
+def test_picamera2_frames_enter_the_ring_without_a_copy():
+    camera = _Camera()
+    source = Picamera2Source(camera)
+    ring = FrameRing(slots=2)
+
+    for _ in range(3):
+        ring.write(source.read)
+        seq, frame, slot = ring.read_latest()
+        assert frame is camera.frames[-1]
+        ring.release(slot)
@@ -0,0 +1,33 @@
+import numpy as np
+from benchmarks.recognition_bench import sweep
+from widgets.widget_handlers.facial_recognition.fr_files import FaceMatcher, Gallery
+
+
+def test_sweep_accepts_like_the_matcher():
+    # A match exactly at the threshold is unknown to FaceMatcher, so the
+    # sweep must not count it as accepted either
+    scores = [("ann", "ann", 0.5), ("ben", "ben", 1.0)]
+    thresholds = [0.5, 1.0, 1.5]
+    results = {result["threshold"]: result for result in sweep(scores, {"ann", "ben"}, thresholds)}
+
+    assert results[0.5]["recall"] == 0.0
+    assert results[1.0]["recall"] == 0.5
+    assert results[1.5]["recall"] == 1.0
+
+
+def test_matcher_rejects_a_distance_equal_to_the_threshold():
+    gallery = Gallery(np.zeros((1, 2), dtype=np.float32), ("ann",), version=(1,))
+    face = np.array([1.0, 0.0], dtype=np.float32)
+
+    assert FaceMatcher(threshold=1.0).match_names([face], gallery) == [FaceMatcher.UNKNOWN]
+    assert sweep([("ann", "ann", 1.0)], {"ann"}, [1.0])[0]["recall"] == 0.0
+
+
+def test_sweep_false_accepts_strangers_under_threshold():
+    scores = [("ann", "ann", 0.2), ("stranger", "ann", 0.8)]
+    results = sweep(scores, {"ann"}, [0.8, 0.9])
+
+    assert results[0]["false_accept_rate"] == 0.0
+    assert results[0]["precision"] == 1.0
+    assert results[1]["false_accept_rate"] == 1.0
+    assert results[1]["precision"] == 0.5
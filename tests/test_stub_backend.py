@@ -0,0 +1,102 @@
+import numpy as np
+import pytest
+from widgets.widget_handlers.facial_recognition.fr_files import (
+    EmbeddingStore,
+    FaceMatcher,
+    FaceTracker,
+    KnownFacesGallery,
+    StubBackend,
+)
+
+ANN, BEN, STRANGER = 64, 128, 224
+
+
+def _frame(*faces):
+    """Black frame with a flat square per (gray level, x) face"""
+    frame = np.zeros((240, 320, 3), dtype=np.uint8)
+    for level, x in faces:
+        frame[60:140, x:x + 80] = level
+    return frame
+
+
+def _encode(backend, frame):
+    bboxes = backend.bboxes(backend.detect_model(frame))
+    batch = backend.face_batch(frame, bboxes, backend.landmarks(bboxes))
+    try:
+        results = list(backend.recog_model.predict_batch(batch.faces))
+    finally:
+        batch.release()
+    return bboxes, [backend.encoding(result) for result in results]
+
+
+@pytest.fixture
+def backend():
+    return StubBackend()
+
+
+@pytest.fixture
+def store(tmp_path, backend):
+    store = EmbeddingStore(str(tmp_path / "store"))
+    _, encodings = _encode(backend, _frame((ANN, 20)))
+    store.rewrite(np.array(encodings), ["ann"], ["h_ann"], ["ann.jpg"], backend.model_name)
+    return store
+
+
+def test_detect_crop_encode_and_match(backend, store):
+    bboxes, encodings = _encode(backend, _frame((ANN, 20), (STRANGER, 200)))
+    gallery = KnownFacesGallery(store).get()
+
+    matches = FaceMatcher(threshold=backend.match_threshold).match(encodings, gallery)
+
+    assert bboxes == [(20, 60, 100, 140), (200, 60, 280, 140)]
+    assert [match.name for match in matches] == ["ann", FaceMatcher.UNKNOWN]
+    assert matches[0].distance == pytest.approx(0.0, abs=1e-5)
+
+
+def test_face_batch_does_not_reference_the_frame(backend):
+    frame = _frame((ANN, 20))
+    batch = backend.face_batch(frame, [(20, 60, 100, 140), (0, 0, 4, 4)])
+
+    frame[:] = 0
+
+    assert batch.indexes == [0]
+    assert int(batch.faces[0].min()) == ANN
+
+
+def test_tracker_keeps_the_assigned_identity(backend, store):
+    now = [0.0]
+    tracker = FaceTracker(
+        confident_distance=backend.match_threshold * 0.8, clock=lambda: now[0]
+    )
+    frame = _frame((ANN, 20), (STRANGER, 200))
+    bboxes, encodings = _encode(backend, frame)
+
+    tracks, box_indexes = tracker.update(bboxes)
+    tracker.assign(
+        tracks,
+        FaceMatcher(threshold=backend.match_threshold).match(
+            [encodings[i] for i in box_indexes], KnownFacesGallery(store).get()
+        ),
+    )
+
+    assert tracker.names() == ["ann"]
+    # Past the unknown retry but before re-verification, only the stranger
+    # is sent to recognition again
+    now[0] = 1.0
+    tracks, _ = tracker.update(bboxes)
+    assert [track.name for track in tracks] == [FaceMatcher.UNKNOWN]
+
+
+def test_store_round_trip(backend, store):
+    _, encodings = _encode(backend, _frame((BEN, 20)))
+    store.append(np.array(encodings), ["ben"], ["h_ben"], ["ben.jpg"], backend.model_name)
+
+    matrix, index, header = store.load()
+    assert header["count"] == 2
+    assert [entry["name"] for entry in index] == ["ann", "ben"]
+    np.testing.assert_array_equal(matrix[1], encodings[0])
+
+    store.rewrite(matrix[1:], ["ben"], ["h_ben"], ["ben.jpg"], backend.model_name)
+    gallery = KnownFacesGallery(store).get()
+    _, probe = _encode(backend, _frame((BEN, 100)))
+    assert FaceMatcher(threshold=backend.match_threshold).match_names(probe, gallery) == ["ben"]
@@ -1 +1,5 @@
 from .widgets import Widgets
+from .image_cache import ImageCache
+from .renderer import DirtyRectRenderer
+from .frame_stats import FrameStats
+from .startup import Startup
@@ -0,0 +1,128 @@
+import time
+
+
+# -- Easing curves, map progress 0..1 to eased progress 0..1 -- #
+def linear(t):
+    return t
+
+
+def ease_out(t):
+    return 1 - (1 - t) ** 2
+
+
+def ease_in_out(t):
+    return t * t * (3 - 2 * t)
+
+
+EASINGS = {"linear": linear, "ease_out": ease_out, "ease_in_out": ease_in_out}
+
+
+class Tween:
+
+    def __init__(self, start, end, duration, started_at, easing=linear):
+        """Interpolates between two values over a fixed time
+
+        Args:
+            start (float): Value at started_at
+            end (float): Value once duration has passed
+            duration (float): Length of the tween in seconds
+            started_at (float): Monotonic time the tween started
+            easing (callable, optional): Easing curve. Defaults to linear.
+        """
+        self.start = start
+        self.end = end
+        self.duration = duration
+        self.started_at = started_at
+        self.easing = easing
+
+    def progress(self, now):
+        if self.duration <= 0:
+            return 1.0
+        return min(max((now - self.started_at) / self.duration, 0.0), 1.0)
+
+    def value(self, now):
+        return self.start + (self.end - self.start) * self.easing(self.progress(now))
+
+    def is_done(self, now):
+        return self.progress(now) >= 1.0
+
+
+class AlphaTrack:
+
+    def __init__(self, animator, value):
+        """Alpha value of one widget, animated against the animator's clock
+
+        Args:
+            animator (Animator): Animator owning the clock
+            value (float): Starting alpha
+        """
+        self._animator = animator
+        self._value = value
+        self._tween = None
+
+    @property
+    def target(self):
+        return self._tween.end if self._tween else self._value
+
+    def set(self, value):
+        """Jump straight to value, cancelling a running tween"""
+        self._tween = None
+        self._value = value
+
+    def animate_to(self, value, duration, easing=linear):
+        """Start a tween from the current alpha to value. Does nothing if the
+        track is already at or heading towards value.
+        """
+        if value == self.target:
+            return
+        now = self._animator.now()
+        self._tween = Tween(self.value(), value, duration, now, easing)
+
+    def value(self):
+        if self._tween is None:
+            return self._value
+        now = self._animator.now()
+        self._value = self._tween.value(now)
+        if self._tween.is_done(now):
+            self._tween = None
+        return self._value
+
+    def alpha(self):
+        """Current value as an int usable by pygame"""
+        return int(round(self.value()))
+
+    def is_active(self):
+        if self._tween is None:
+            return False
+        return not self._tween.is_done(self._animator.now())
+
+
+class Animator:
+
+    def __init__(self, clock=time.monotonic):
+        """Time-based animation of widget alpha tracks
+
+        Args:
+            clock (callable, optional): Returns the current time in seconds.
+                Defaults to time.monotonic.
+        """
+        self.clock = clock
+        self._tracks = {}
+
+    def now(self):
+        return self.clock()
+
+    def track(self, name, value=255):
+        """Returns the alpha track for name, creating it on first use"""
+        if name not in self._tracks:
+            self._tracks[name] = AlphaTrack(self, value)
+        return self._tracks[name]
+
+    def tracks(self):
+        return self._tracks.items()
+
+    def is_animating(self):
+        """Checks if any track has a tween running, the main loop has to keep
+        redrawing until this is False
+        """
+        return any(track.is_active() for track in self._tracks.values())
@@ -0,0 +1,19 @@
+import pygame
+
+# Posted from background threads to wake the main loop while it is idle
+PRESENCE_CHANGED = pygame.event.custom_type()
+WEATHER_UPDATED = pygame.event.custom_type()
+STARTUP_READY = pygame.event.custom_type()
+
+
+def post_wakeup(event_type):
+    """Post a wake-up event to the pygame queue. Safe to call from any thread.
+
+    Args:
+        event_type (int): One of the custom event types in this module
+    """
+    try:
+        pygame.event.post(pygame.event.Event(event_type))
+    except pygame.error:
+        # Display not initialised yet or already shut down, nothing to wake
+        pass
@@ -1 +1,2 @@
-from .font_handler import FontHandler
\ No newline at end of file
+from .font_handler import FontHandler, GlyphAtlas
+from .text_cache import TextCache
\ No newline at end of file
@@ -1,4 +1,65 @@
 import os
+import pygame
+from decouple import config
+from .text_cache import TextCache
+
+
+class GlyphAtlas:
+    # Digits, punctuation and the letters used by the clock and temperatures
+    _CHARSET = "0123456789:.,-+%/ " + chr(0xB0) + "aApPmMFCHighLow"
+
+    def __init__(self, font, aliasing, color, charset=_CHARSET):
+        """Pre-rasterized glyphs of one font, size and color, composed into
+        strings without a FreeType render
+
+        Args:
+            font (pygame.Font): Font to rasterize
+            aliasing (bool): Antialias the glyphs
+            color ((int, int, int)): Glyph color
+            charset (str, optional): Characters to rasterize. Defaults to _CHARSET.
+        """
+        self._font = font
+        self._charset = frozenset(charset)
+        self._glyphs = {
+            char: font.render(char, aliasing, color).convert_alpha()
+            for char in charset
+        }
+        widths = {char: font.size(char)[0] for char in charset}
+        # Advance of a glyph depends on the glyph after it, so kerning pairs
+        # are measured once here: advance(a, b) = width(ab) - width(b)
+        # "\0" stands for the end of the string, where there is no pair
+        self._advances = {}
+        for first in charset:
+            self._advances[(first, "\0")] = widths[first]
+            for second in charset:
+                self._advances[(first, second)] = (
+                    font.size(first + second)[0] - widths[second]
+                )
+
+    def can_render(self, input_str):
+        return self._charset.issuperset(input_str)
+
+    def render(self, input_str):
+        """Compose input_str from cached glyphs
+
+        Returns:
+            Surface: Pygame surface of the string
+        """
+        blit_sequence = []
+        x = 0
+        next_chars = input_str[1:] + "\0"
+        for char, next_char in zip(input_str, next_chars):
+            # MAX keeps the coverage of neighbouring glyphs that overlap
+            blit_sequence.append(
+                (self._glyphs[char], (x, 0), None, pygame.BLEND_RGBA_MAX)
+            )
+            x += self._advances[(char, next_char)]
+        # Measuring is a layout pass only, it keeps the size identical to
+        # font.render so the layout does not shift between the two paths
+        surface = pygame.Surface(self._font.size(input_str), pygame.SRCALPHA)
+        surface.blits(blit_sequence, doreturn=False)
+        return surface
+
 
 class FontHandler:
 
@@ -25,6 +86,13 @@ class FontHandler:
         self.modern_sans_light = self._build_font_size_dict(self._modern_sans_light_path)
         self.modern_deco = self._build_font_size_dict(self._modern_deco_path)
         self.raleway_light = self._build_font_size_dict(self._raleway_light_path)
+
+        self.text_cache = TextCache()
+        self._atlases = {}
+        if config("GLYPH_ATLAS", default=False, cast=bool):
+            for font_dict in (self.modern_sans_light, self.raleway_light):
+                for font in font_dict.values():
+                    self._build_atlas(font)
     
     def _build_font_size_dict(self, font_path):
         """Construct Font dictionary with different sizes
@@ -40,6 +108,27 @@ class FontHandler:
             new_font[key] = self.smart_mirror.import_font(font_path, value)
         return new_font
     
-    def render_string(self, input_str, font, aliasing=True, color=(255,255,255)):
+    def _build_atlas(self, font, aliasing=True, color=(255,255,255)):
+        atlas = GlyphAtlas(font, aliasing, color)
+        self._atlases[(font, aliasing, tuple(color))] = atlas
+        return atlas
+
+    def _render(self, input_str, font, aliasing, color):
+        atlas = self._atlases.get((font, aliasing, tuple(color)))
+        if atlas is not None and input_str and atlas.can_render(input_str):
+            return atlas.render(input_str)
         return font.render(input_str, aliasing, color)
-        
\ No newline at end of file
+
+    def render_string(self, input_str, font, aliasing=True, color=(255,255,255)):
+        """Render a string, reusing the surface from previous frames when the
+        text, font, color and aliasing are unchanged
+
+        Returns:
+            Surface: Pygame surface of the string. Shared with the cache, so it
+            must not be drawn on.
+        """
+        return self.text_cache.get(input_str, font, aliasing, color, self._render)
+
+    def end_frame(self):
+        """Evict cached strings that were not rendered this frame"""
+        self.text_cache.evict_unused()
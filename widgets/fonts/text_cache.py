@@ -0,0 +1,43 @@
+class TextCache:
+
+    def __init__(self):
+        """Retained-mode cache of rendered text surfaces.
+
+        Surfaces are keyed by (text, font, size, color, antialias) and kept
+        for as long as they are requested at least once per frame.
+        """
+        self._surfaces = {}
+        self._used_keys = set()
+
+    def _make_key(self, input_str, font, aliasing, color):
+        return (input_str, font, font.get_height(), tuple(color), aliasing)
+
+    def get(self, input_str, font, aliasing, color, render_func):
+        """Returns the cached surface for a string, rendering it on a miss
+
+        Args:
+            input_str (str): String to render
+            font (pygame.Font): Font to render with
+            aliasing (bool): Antialias the text
+            color ((int, int, int)): Text color
+            render_func (callable): Called with the same args on a cache miss
+
+        Returns:
+            Surface: Pygame surface of the string
+        """
+        key = self._make_key(input_str, font, aliasing, color)
+        self._used_keys.add(key)
+        surface = self._surfaces.get(key)
+        if surface is None:
+            surface = render_func(input_str, font, aliasing, color)
+            self._surfaces[key] = surface
+        return surface
+
+    def evict_unused(self):
+        """Drops every surface that was not requested since the last call"""
+        for key in self._surfaces.keys() - self._used_keys:
+            del self._surfaces[key]
+        self._used_keys = set()
+
+    def __len__(self):
+        return len(self._surfaces)
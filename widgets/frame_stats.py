@@ -0,0 +1,113 @@
+import threading
+import time
+from collections import deque
+
+
+class _Timer:
+    __slots__ = ("_stats", "_name", "_start")
+
+    def __init__(self, stats, name):
+        self._stats = stats
+        self._name = name
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stats.record(self._name, time.perf_counter() - self._start)
+
+
+class FrameStats:
+    _WINDOW = 900
+    _QUANTILES = (0.5, 0.95, 0.99)
+
+    def __init__(self, frame_budget=1 / 30, window=_WINDOW):
+        """Rolling frame-time samples per render stage
+
+        Recording is an append to a bounded deque, percentiles are only
+        computed when the stats are read.
+
+        Args:
+            frame_budget (float, optional): Seconds a frame may take before it
+                counts as dropped. Defaults to 1/30.
+            window (int, optional): Samples kept per stage. Defaults to 900,
+                30 seconds at full frame rate.
+        """
+        self.frame_budget = frame_budget
+        self.window = window
+        self._samples = {}
+        self._totals = {}
+        self._counters = {"frames": 0, "dropped_frames": 0}
+        self._lock = threading.Lock()
+
+    def time(self, name):
+        """Context manager recording how long its block took under name"""
+        return _Timer(self, name)
+
+    def record(self, name, seconds):
+        with self._lock:
+            samples = self._samples.get(name)
+            if samples is None:
+                samples = self._samples[name] = deque(maxlen=self.window)
+                self._totals[name] = [0, 0.0]
+            samples.append(seconds)
+            totals = self._totals[name]
+            totals[0] += 1
+            totals[1] += seconds
+
+    def record_frame(self, seconds):
+        """Record a whole frame and count it as dropped if it went over budget"""
+        self.record("frame", seconds)
+        with self._lock:
+            self._counters["frames"] += 1
+            if seconds > self.frame_budget:
+                self._counters["dropped_frames"] += 1
+
+    def _percentile(self, ordered, quantile):
+        index = min(int(quantile * len(ordered)), len(ordered) - 1)
+        return ordered[index]
+
+    def snapshot(self):
+        """Returns:
+            dict: Counters and per-stage count, sum and p50/p95/p99 in seconds
+        """
+        with self._lock:
+            samples = {name: sorted(values) for name, values in self._samples.items()}
+            totals = {name: tuple(value) for name, value in self._totals.items()}
+            counters = dict(self._counters)
+        stages = {}
+        for name, ordered in samples.items():
+            count, total = totals[name]
+            stage = {"count": count, "sum": total}
+            for quantile in self._QUANTILES:
+                key = f"p{int(quantile * 100)}"
+                stage[key] = self._percentile(ordered, quantile) if ordered else 0.0
+            stages[name] = stage
+        return {
+            "frame_budget": self.frame_budget,
+            "counters": counters,
+            "stages": stages,
+        }
+
+    def to_prometheus(self, prefix="smart_mirror"):
+        """Returns:
+            str: Snapshot in the Prometheus text exposition format
+        """
+        snapshot = self.snapshot()
+        lines = [
+            f"# HELP {prefix}_stage_seconds Render stage duration",
+            f"# TYPE {prefix}_stage_seconds summary",
+        ]
+        for name, stage in snapshot["stages"].items():
+            for quantile in self._QUANTILES:
+                value = stage[f"p{int(quantile * 100)}"]
+                lines.append(
+                    f'{prefix}_stage_seconds{{stage="{name}",quantile="{quantile}"}} {value}'
+                )
+            lines.append(f'{prefix}_stage_seconds_sum{{stage="{name}"}} {stage["sum"]}')
+            lines.append(f'{prefix}_stage_seconds_count{{stage="{name}"}} {stage["count"]}')
+        for name, value in snapshot["counters"].items():
+            lines.append(f"# TYPE {prefix}_{name}_total counter")
+            lines.append(f"{prefix}_{name}_total {value}")
+        return "\n".join(lines) + "\n"
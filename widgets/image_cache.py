@@ -0,0 +1,65 @@
+import os
+from collections import OrderedDict
+import pygame
+
+
+class ImageCache:
+    _MAX_ENTRIES = 128
+
+    def __init__(self, max_entries=_MAX_ENTRIES):
+        """Bounded LRU cache of scaled images converted to the display format.
+
+        Args:
+            max_entries (int, optional): Surfaces kept before the least
+                recently used one is dropped. Defaults to 128.
+        """
+        self.max_entries = max_entries
+        self._surfaces = OrderedDict()
+
+    def _load(self, icon_path, size):
+        icon = pygame.image.load(icon_path)
+        if size:
+            icon = pygame.transform.scale(icon, (size, size))
+        return icon.convert_alpha()
+
+    def get(self, icon_path, size):
+        """Returns the surface for icon_path at size, loading it on a miss
+
+        Args:
+            icon_path (Path): Path to the image file
+            size (int): Width and height to scale to, None keeps the file size
+
+        Returns:
+            Surface: Pygame surface in the display pixel format
+        """
+        key = (icon_path, size)
+        icon = self._surfaces.get(key)
+        if icon is not None:
+            self._surfaces.move_to_end(key)
+            return icon
+        icon = self._load(icon_path, size)
+        self._surfaces[key] = icon
+        if len(self._surfaces) > self.max_entries:
+            self._surfaces.popitem(last=False)
+        return icon
+
+    def preload(self, icon_dir, sizes):
+        """Load every .png under icon_dir at each of the given sizes
+
+        Args:
+            icon_dir (Path): Directory searched recursively for icons
+            sizes ((int,)): Sizes the icons are drawn at
+        """
+        for dir_path, _, filenames in os.walk(icon_dir):
+            for filename in filenames:
+                if not filename.endswith(".png"):
+                    continue
+                icon_path = os.path.join(dir_path, filename)
+                for size in sizes:
+                    try:
+                        self.get(icon_path, size)
+                    except pygame.error as e:
+                        print(f"Failed to preload {icon_path}: {e}")
+
+    def __len__(self):
+        return len(self._surfaces)
@@ -0,0 +1,93 @@
+import pygame
+
+
+class WidgetLayout:
+
+    def __init__(self, anchor, constraints=()):
+        """Placement of a group of widget surfaces
+
+        Args:
+            anchor (str): Rect attribute of the screen the group's bounding box
+                is pinned to, e.g. "topleft", "midtop" or "bottomright"
+            constraints ([(str, str, str, str, offset),], optional): Applied in
+                order as item.attr = ref.ref_attr + offset. offset is an int,
+                an (x, y) tuple or a callable taking the rect dict and
+                returning one. The first item of the group is not constrained.
+        """
+        self.anchor = anchor
+        self.constraints = constraints
+
+    def _add_offset(self, value, offset):
+        if isinstance(value, tuple):
+            if not offset:
+                return value
+            return (value[0] + offset[0], value[1] + offset[1])
+        return value + offset
+
+    def resolve(self, sizes, screen_rect):
+        """Compute the rects of every item
+
+        Args:
+            sizes ({str: (int, int)}): Surface size of each item
+            screen_rect (Rect): Rect of the screen
+
+        Returns:
+            {str: Rect}: Screen rect of each item
+        """
+        rects = {name: pygame.Rect((0, 0), size) for name, size in sizes.items()}
+        for item, attr, ref, ref_attr, offset in self.constraints:
+            if callable(offset):
+                offset = offset(rects)
+            value = getattr(rects[ref], ref_attr)
+            setattr(rects[item], attr, self._add_offset(value, offset))
+
+        group_rect = pygame.Rect(0, 0, 0, 0)
+        if rects:
+            group_rect = next(iter(rects.values())).unionall(list(rects.values()))
+        anchored_rect = group_rect.copy()
+        setattr(anchored_rect, self.anchor, getattr(screen_rect, self.anchor))
+        dx = anchored_rect.x - group_rect.x
+        dy = anchored_rect.y - group_rect.y
+        for rect in rects.values():
+            rect.move_ip(dx, dy)
+        return rects
+
+
+class LayoutEngine:
+
+    def __init__(self, screen_rect):
+        """Positions widget groups and caches the result until a surface
+        size or the screen size changes
+
+        Args:
+            screen_rect (Rect): Rect of the screen
+        """
+        self.screen_rect = screen_rect
+        self._layouts = {}
+        self._cache = {}
+
+    def register(self, name, layout):
+        self._layouts[name] = layout
+        self._cache.pop(name, None)
+
+    def is_registered(self, name):
+        return name in self._layouts
+
+    def place(self, name, sizes):
+        """Returns the rects of a widget group
+
+        Args:
+            name (str): Name the layout was registered under
+            sizes ({str: (int, int)}): Surface size of each item
+
+        Returns:
+            {str: Rect}: Screen rect of each item. Shared with the cache, so it
+            must not be modified.
+        """
+        key = (tuple(sizes.items()), self.screen_rect.size)
+        cached = self._cache.get(name)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        rects = self._layouts[name].resolve(sizes, self.screen_rect)
+        self._cache[name] = (key, rects)
+        return rects
@@ -0,0 +1,100 @@
+import pygame
+from .frame_stats import FrameStats
+
+
+class DirtyRectRenderer:
+    _BACKGROUND = (0, 0, 0)
+    _MAX_DIRTY_RECTS = 8
+
+    def __init__(self, screen, dirty_rects=True, frame_stats=None):
+        """Draws widget surfaces to the screen, only pushing the regions that
+        changed since the last frame.
+
+        Args:
+            screen (Surface): Display surface
+            dirty_rects (bool, optional): False always redraws and flips the
+                whole screen. Defaults to True.
+            frame_stats (FrameStats, optional): Records blit and flip times.
+                Defaults to None.
+        """
+        self.screen = screen
+        self.dirty_rects = dirty_rects
+        self.frame_stats = frame_stats or FrameStats()
+        self._previous = None
+
+    def _frame_signature(self, draw_list):
+        return [(surface, alpha, tuple(rect)) for surface, rect, alpha in draw_list]
+
+    def _composite(self, surface, rect, alpha):
+        # Surfaces are shared with the text and image caches, so the alpha
+        # is applied here, right before the blit, and only when it differs
+        if surface.get_alpha() != alpha:
+            surface.set_alpha(alpha)
+        self.screen.blit(surface, rect)
+
+    def _changed_rects(self, previous, current):
+        previous_set = set(previous)
+        current_set = set(current)
+        changed = [pygame.Rect(sig[2]) for sig in previous if sig not in current_set]
+        changed += [pygame.Rect(sig[2]) for sig in current if sig not in previous_set]
+        return changed
+
+    def _merge_rects(self, rects):
+        """Union overlapping rects so no region is redrawn twice"""
+        merged = []
+        for rect in rects:
+            rect = rect.copy()
+            overlap = rect.collidelist(merged)
+            while overlap != -1:
+                rect.union_ip(merged.pop(overlap))
+                overlap = rect.collidelist(merged)
+            merged.append(rect)
+        return merged
+
+    def _draw_full(self, draw_list):
+        with self.frame_stats.time("blit"):
+            self.screen.fill(self._BACKGROUND)
+            for surface, rect, alpha in draw_list:
+                self._composite(surface, rect, alpha)
+        with self.frame_stats.time("flip"):
+            pygame.display.flip()
+
+    def _draw_dirty(self, draw_list, dirty):
+        with self.frame_stats.time("blit"):
+            for dirty_rect in dirty:
+                self.screen.set_clip(dirty_rect)
+                self.screen.fill(self._BACKGROUND)
+                for surface, rect, alpha in draw_list:
+                    if dirty_rect.colliderect(rect):
+                        self._composite(surface, rect, alpha)
+            self.screen.set_clip(None)
+        with self.frame_stats.time("flip"):
+            pygame.display.update(dirty)
+
+    def invalidate(self):
+        """Force the next frame to redraw the whole screen"""
+        self._previous = None
+
+    def draw(self, draw_list, animating=False):
+        """Draw a frame
+
+        Args:
+            draw_list ([(Surface, Rect, int),]): Surfaces, where to draw them
+                and the alpha to composite them with
+            animating (bool, optional): A fade is running, so a full-screen
+                push is allowed when several widgets changed. Defaults to False.
+        """
+        current = self._frame_signature(draw_list)
+        previous = self._previous
+        self._previous = current
+        if not self.dirty_rects or previous is None:
+            self._draw_full(draw_list)
+            return
+        changed = self._changed_rects(previous, current)
+        if not changed:
+            return
+        if animating and len(changed) > self._MAX_DIRTY_RECTS:
+            self._draw_full(draw_list)
+            return
+        dirty = self._merge_rects(changed)
+        self._draw_dirty(draw_list, [r.clip(self.screen.get_rect()) for r in dirty])
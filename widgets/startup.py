@@ -0,0 +1,151 @@
+import sys
+import threading
+import time
+
+
+class _Task:
+    __slots__ = ("name", "func", "requires", "result", "error", "started", "finished", "done")
+
+    def __init__(self, name, func, requires):
+        self.name = name
+        self.func = func
+        self.requires = requires
+        self.result = None
+        self.error = None
+        self.started = None
+        self.finished = None
+        self.done = threading.Event()
+
+
+class Startup:
+
+    def __init__(self, on_ready=None, clock=time.perf_counter, start=None):
+        """Runs the slow parts of startup (camera, models, weather) on
+        background threads so the first frame does not wait for them
+
+        Every task gets its own thread and starts as soon as the tasks it
+        requires are done, so independent tasks run concurrently. The main
+        loop collects finished tasks with poll() and attaches their results.
+
+        Args:
+            on_ready (callable, optional): on_ready(name) from the task's
+                thread when a task finishes, e.g. to wake the main loop
+            clock (callable, optional): Defaults to time.perf_counter
+            start (float, optional): clock() value the timeline counts
+                from, e.g. taken before the imports. Defaults to now.
+        """
+        self.on_ready = on_ready
+        self.clock = clock
+        self._start = clock() if start is None else start
+        self._tasks = {}
+        self._collected = set()
+        self._marks = []
+        self._lock = threading.Lock()
+
+    def add(self, name, func, requires=()):
+        """Register a task
+
+        Args:
+            name (str): Task name, also used in the timeline
+            func (callable): func(*results of requires) -> result
+            requires ((str,), optional): Tasks whose results func takes
+        """
+        self._tasks[name] = _Task(name, func, tuple(requires))
+
+    @staticmethod
+    def _log(message):
+        # stderr, so tools printing JSON on stdout stay parseable
+        print(f"Startup: {message}", file=sys.stderr)
+
+    def _elapsed(self):
+        return self.clock() - self._start
+
+    def _run(self, task):
+        required = [self._tasks[name] for name in task.requires]
+        for dependency in required:
+            dependency.done.wait()
+        failed = [dependency.name for dependency in required if dependency.error]
+        task.started = self._elapsed()
+        if failed:
+            task.error = RuntimeError(f"requires {', '.join(failed)}, which failed")
+        else:
+            try:
+                task.result = task.func(*[dependency.result for dependency in required])
+            except Exception as e:
+                task.error = e
+        task.finished = self._elapsed()
+        if task.error:
+            self._log(f"{task.name} failed at {task.finished:.3f}s: {task.error}")
+        else:
+            self._log(
+                f"{task.name} ready at {task.finished:.3f}s "
+                f"(took {task.finished - task.started:.3f}s)"
+            )
+        task.done.set()
+        if self.on_ready:
+            self.on_ready(task.name)
+
+    def start(self):
+        for task in self._tasks.values():
+            threading.Thread(
+                target=self._run, args=(task,), name=f"startup-{task.name}", daemon=True
+            ).start()
+        return self
+
+    def poll(self):
+        """Tasks that finished since the last call. Failed tasks are left
+        out, their error is in the timeline.
+
+        Returns:
+            [(str, object),]: Name and result of each newly finished task
+        """
+        ready = []
+        for name, task in self._tasks.items():
+            if name in self._collected or not task.done.is_set():
+                continue
+            self._collected.add(name)
+            if task.error is None:
+                ready.append((name, task.result))
+        return ready
+
+    def wait(self, name, timeout=None):
+        """Block until a task is done
+
+        Returns:
+            object: Task result, None if it failed or timed out
+        """
+        task = self._tasks[name]
+        task.done.wait(timeout)
+        return task.result
+
+    def is_done(self):
+        return all(task.done.is_set() for task in self._tasks.values())
+
+    def mark(self, event):
+        """Record a point on the timeline, e.g. the first frame, once"""
+        with self._lock:
+            if any(name == event for name, _ in self._marks):
+                return
+            elapsed = self._elapsed()
+            self._marks.append((event, elapsed))
+        self._log(f"{event} at {elapsed:.3f}s")
+
+    def timeline(self):
+        """Returns:
+            [dict,]: Start and finish time in seconds of every task, and the
+            time of every mark, in order of occurrence
+        """
+        entries = [
+            {"name": name, "at": elapsed} for name, elapsed in list(self._marks)
+        ]
+        for task in self._tasks.values():
+            if task.done.is_set():
+                entries.append(
+                    {
+                        "name": task.name,
+                        "started": task.started,
+                        "at": task.finished,
+                        "error": str(task.error) if task.error else None,
+                    }
+                )
+        return sorted(entries, key=lambda entry: entry["at"])
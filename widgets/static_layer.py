@@ -0,0 +1,38 @@
+import pygame
+
+
+class StaticLayer:
+    _BACKGROUND = (0, 0, 0)
+
+    def __init__(self):
+        """Widgets that never change, pre-composited into one opaque surface
+        so they cost a single plain blit per frame
+        """
+        self._key = None
+        self._surface = None
+        self._rect = None
+
+    def _composite(self, draw_list):
+        rect = draw_list[0][1].unionall([item_rect for _, item_rect, _ in draw_list])
+        layer = pygame.Surface(rect.size).convert()
+        layer.fill(self._BACKGROUND)
+        for surface, item_rect, alpha in draw_list:
+            surface.set_alpha(alpha)
+            layer.blit(surface, item_rect.move(-rect.x, -rect.y))
+        return layer, rect
+
+    def get(self, key, build_func):
+        """Returns the composited layer, rebuilding it only when key changes
+
+        Args:
+            key (hashable): Everything the static widgets depend on
+            build_func (callable): Returns [(Surface, Rect, int),] of the
+                static widgets in screen coordinates
+
+        Returns:
+            (Surface, Rect): Layer surface and where to draw it
+        """
+        if key != self._key:
+            self._surface, self._rect = self._composite(build_func())
+            self._key = key
+        return self._surface, self._rect
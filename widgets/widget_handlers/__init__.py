@@ -1,5 +1,63 @@
+from decouple import config
 from .weather.weather_client import WeatherClient
 from .facial_recognition.facial_rec_handler import FacialRecognitionHandler
+from .facial_recognition.fr_files import (
+    initialize_detect_model,
+    initialize_recog_model,
+    picam2_init,
+)
 
-weather_client = WeatherClient()
-facial_rec_handler = FacialRecognitionHandler()
+# Shared handlers, created on first use rather than at import so that the
+# widgets can be imported without a camera, models or network
+_weather_client = None
+_facial_rec_handler = None
+
+
+def get_weather_client():
+    global _weather_client
+    if _weather_client is None:
+        _weather_client = WeatherClient()
+    return _weather_client
+
+
+def get_facial_rec_handler(picam2=None, face_detect_model=None, face_recog_model=None):
+    """Shared handler, built on the given camera and models the first time"""
+    global _facial_rec_handler
+    if _facial_rec_handler is None:
+        _facial_rec_handler = FacialRecognitionHandler(
+            picam2=picam2,
+            face_detect_model=face_detect_model,
+            face_recog_model=face_recog_model,
+        )
+    return _facial_rec_handler
+
+
+def _skip():
+    return None
+
+
+def add_startup_tasks(startup, weather=True, facial_recognition=True):
+    """Register the tasks that build the shared handlers on a Startup. The
+    camera and both Hailo models initialize concurrently and the handler is
+    assembled from them, while the weather client loads alongside.
+
+    Args:
+        startup (Startup): Orchestrator to add the tasks to
+        weather (bool, optional): Add the "weather" task. Defaults to True.
+        facial_recognition (bool, optional): Add the "facial_recognition"
+            task and the tasks it needs. Defaults to True.
+    """
+    if weather:
+        startup.add("weather", get_weather_client)
+    if not facial_recognition:
+        return
+    use_camera = config("FRAME_SOURCE", default="picamera2") == "picamera2"
+    use_hailo = config("RECOGNITION_BACKEND", default="hailo") == "hailo"
+    startup.add("camera", picam2_init if use_camera else _skip)
+    startup.add("detect_model", initialize_detect_model if use_hailo else _skip)
+    startup.add("recog_model", initialize_recog_model if use_hailo else _skip)
+    startup.add(
+        "facial_recognition",
+        get_facial_rec_handler,
+        requires=("camera", "detect_model", "recog_model"),
+    )
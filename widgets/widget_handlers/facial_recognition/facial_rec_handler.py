@@ -1,92 +1,178 @@
-from .fr_files import initialize_models, picam2_init, FacialRecognition
-import os
+from .fr_files import (
+    logger,
+    make_backend,
+    picam2_init,
+    FacialRecognition,
+    KnownFacesGallery,
+    FaceTracker,
+    MotionGate,
+    RecognitionPipeline,
+    make_frame_source,
+)
+from decouple import config
 import threading
-import time
 
 
 class FacialRecognitionHandler:
 
-    def __init__(self):
+    def __init__(
+        self,
+        picam2=None,
+        face_detect_model=None,
+        face_recog_model=None,
+        store_dir=None,
+        frame_source=None,
+        backend=None,
+    ):
         """Class to handle Facial Recognition Widget
+
+        Args:
+            picam2 (Picamera2, optional): Camera, opened when not given and
+                FRAME_SOURCE is the camera
+            face_detect_model (degirum.Model, optional): Hailo detection
+                model, loaded when not given
+            face_recog_model (degirum.Model, optional): Hailo recognition
+                model, loaded when not given
+            store_dir (Path, optional): Embedding store directory
+            frame_source (optional): Frames for the recognition pipeline,
+                built from FRAME_SOURCE when not given (the camera by default)
+            backend (RecognitionBackend, optional): Built from
+                RECOGNITION_BACKEND when not given
         """
-        self.picam2 = picam2_init()
-        self.face_detect_model, self.face_recog_model = initialize_models()
-        self.facial_recognition = FacialRecognition(self.picam2)
+        if picam2 is None and config("FRAME_SOURCE", default="picamera2") == "picamera2":
+            picam2 = picam2_init()
+        self.picam2 = picam2
+        if backend is None:
+            backend = make_backend(
+                config("RECOGNITION_BACKEND", default="hailo"),
+                detect_model=face_detect_model,
+                recog_model=face_recog_model,
+            )
+        self.backend = backend
+        self.facial_recognition = FacialRecognition(
+            self.picam2, store_dir=store_dir, backend=backend
+        )
+        self.known_faces = KnownFacesGallery(
+            self.facial_recognition.store,
+            index_builder=self.facial_recognition.index_builder,
+        )
         self.in_frame = []
         self.in_frame_datalock = threading.Lock()
         self.stop_event = threading.Event()
+        self.on_presence_change = None
+        self.frame_source = frame_source
+        self.pipeline = None
+        self.tracker = FaceTracker(
+            confident_distance=self.facial_recognition.matcher.threshold
+            * config("TRACK_CONFIDENT_RATIO", default=0.8, cast=float),
+            reverify_seconds=config("TRACK_REVERIFY_SECONDS", default=5.0, cast=float),
+        )
 
-    def _run_recognition(self, detect_model, recog_model):
-        """Run facial detection and recognition on a frame
+    def _ensure_known_faces(self):
+        """Learn the saved faces on the first run, before the store exists,
+        and again when the store was encoded by another backend's model,
+        whose embeddings cannot be matched with this one's
+        """
+        header = self.facial_recognition.store.read_header()
+        model = self.facial_recognition.backend.model_name
+        if header is not None and header["model"] == model:
+            return
+        if header is not None:
+            logger.info(f"Known faces were encoded with {header['model']}, relearning with {model}")
+        self.facial_recognition.learn_new_faces()
+        self.known_faces.reload(force=True)
+
+    # -- Pipeline stages -- #
+    def _detect(self, frame):
+        """Detect the faces of a frame and crop those whose track needs
+        recognizing
 
         Returns:
-            [str, ]: List of names detected
+            ([Track,], FaceBatch): Tracks to recognize and their faces. Tracks
+            whose box could not be cropped are left out and retried later.
         """
-        if not os.path.exists(self.facial_recognition._JSON_PATH):
-            self.facial_recognition.learn_new_faces_hailo(
-                detect_model=detect_model, recog_model=recog_model
-                )
-        try:
-            named_faces = self.facial_recognition.process_new_image_hailo(
-                detect_model=detect_model, recog_model=recog_model
-            )
-            named_faces[:] = [x for x in named_faces if x != 'unknown']
-
-            if not named_faces:
-                return None
-            return named_faces
-        except Exception: 
-            return None
-        
-    def _process_named_faces(self, named_faces):
-        """Processes a list of names from recognition to update faces in frame
-        and remove unknown entries
+        bboxes, landmarks = self.facial_recognition.locate_faces(frame)
+        tracks, box_indexes = self.tracker.update(bboxes)
+        batch = self.facial_recognition.prepare_faces(
+            frame,
+            [bboxes[box_index] for box_index in box_indexes],
+            [landmarks[box_index] for box_index in box_indexes] if landmarks else None,
+        )
+        return [tracks[i] for i in batch.indexes], batch
 
-        Args:
-            named_faces ([str,]): List of detected names from facial recognition
+    def _recognize(self, detections):
+        """Recognize the faces of new or stale tracks
 
         Returns:
-            [str, ]: List of names within frame
+            [str, ]: Names of every recognized track in view
         """
+        if detections is None:
+            return None
+        tracks, batch = detections
+        try:
+            if tracks:
+                matches = self.facial_recognition.match_faces(
+                    batch.faces, gallery=self.known_faces.get()
+                )
+                self.tracker.assign(tracks, matches)
+        finally:
+            batch.release()
+        return self.tracker.names()
+
+    def _discard(self, detections):
+        """Release the faces of detections that were never recognized"""
+        if detections is not None:
+            detections[1].release()
+
+    def _publish_tracked_names(self, names):
+        """Set the names in frame straight from the tracks"""
+        if names is None:
+            return
         with self.in_frame_datalock:
-            in_frame_copy = self.in_frame[:]
-        if named_faces is None:
-            in_frame_copy = []
-        elif len(in_frame_copy) == 0:
-            in_frame_copy = named_faces
-        else:
-            names_to_remove = []
-            for face in in_frame_copy:
-                if face not in named_faces:
-                    names_to_remove.append(face)
-            for remove_name in names_to_remove:
-                in_frame_copy.remove(remove_name)
-        return in_frame_copy
-
-    def _update_in_frame(self):
-        """Update names of recognized faces in frame
-        """
-        while not self.stop_event.is_set():
-            named_faces = self._run_recognition(
-                detect_model=self.face_detect_model, recog_model=self.face_recog_model
-            )
-            in_frame_copy = self._process_named_faces(named_faces)
-            with self.in_frame_datalock:
-                self.in_frame = in_frame_copy[:]
-            time.sleep(1)
+            changed = self.in_frame != names
+            self.in_frame = names[:]
+        if changed and self.on_presence_change:
+            self.on_presence_change()
+
+    def _motion_gate(self):
+        if not config("MOTION_GATE", default=True, cast=bool):
+            return None
+        return MotionGate(
+            changed_fraction=config("MOTION_CHANGED_FRACTION", default=0.01, cast=float),
+            recheck_seconds=config("MOTION_RECHECK_SECONDS", default=2.0, cast=float),
+        )
 
     def start_in_frame_thread(self):
-        """Starts the thread that handles updated faces in frame
+        """Starts the capture, detection and recognition pipeline that
+        keeps the faces in frame up to date
+
+        Returns:
+            RecognitionPipeline: Joinable like a thread
         """
-        in_frame_thread = threading.Thread(target=self._update_in_frame, daemon=True)
-        in_frame_thread.start()
-        return in_frame_thread
+        if self.frame_source is None:
+            self.frame_source = make_frame_source(
+                config("FRAME_SOURCE", default="picamera2"), self.picam2
+            )
+        self.pipeline = RecognitionPipeline(
+            self.frame_source,
+            detect_func=self._detect,
+            recognize_func=self._recognize,
+            publish_func=self._publish_tracked_names,
+            discard_func=self._discard,
+            stop_event=self.stop_event,
+            setup_func=self._ensure_known_faces,
+            slots=config("FRAME_RING_SLOTS", default=3, cast=int),
+            capture_fps=config("CAPTURE_FPS", default=30.0, cast=float),
+            motion_gate=self._motion_gate(),
+        )
+        return self.pipeline.start()
 
     def add_new_face(self, name):
         self.facial_recognition.capture_new_face(name)
-        self.facial_recognition.learn_new_faces_hailo()
+        self.facial_recognition.learn_new_faces()
+        self.known_faces.reload(force=True)
 
 
 if __name__ == "__main__":
     fr = FacialRecognitionHandler()
-    fr.add_new_face()
+    fr.add_new_face(input("What is your name: "))
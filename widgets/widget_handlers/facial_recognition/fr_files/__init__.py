@@ -1,2 +1,32 @@
-from .fr_functions import logger, initialize_models, picam2_init
-from .facial_recognition import FacialRecognition
\ No newline at end of file
+from .fr_functions import (
+    logger,
+    initialize_models,
+    initialize_detect_model,
+    initialize_recog_model,
+    picam2_init,
+)
+from .facial_recognition import FacialRecognition
+from .known_faces import KnownFacesGallery, Gallery
+from .face_matcher import FaceMatcher, FaceMatch
+from .embedding_store import EmbeddingStore
+from .inference_worker import InferenceWorker
+from .frame_ring import FrameRing
+from .frame_sources import (
+    Picamera2Source,
+    VideoFileSource,
+    ImageDirSource,
+    SyntheticSource,
+    make_frame_source,
+)
+from .pipeline import RecognitionPipeline
+from .motion_gate import MotionGate
+from .face_tracker import FaceTracker, Track
+from .face_aligner import FaceAligner, FaceBatch, clamp_bbox, similarity_transform
+from .backends import (
+    RecognitionBackend,
+    HailoBackend,
+    CpuBackend,
+    StubBackend,
+    make_backend,
+)
+from .ann_index import IvfIndex, IvfIndexBuilder
\ No newline at end of file
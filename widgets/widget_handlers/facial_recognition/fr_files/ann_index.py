@@ -0,0 +1,216 @@
+import glob
+import os
+import numpy as np
+from .fr_functions import logger
+
+
+class IvfIndex:
+    FORMAT_VERSION = 1
+
+    def __init__(self, centroids, assignments, metric="l2", n_probe=8, trained_count=None):
+        """Inverted-file index: the gallery rows are split into lists around
+        k-means centroids, and a query is only compared with the rows of the
+        n_probe lists whose centroids are closest to it.
+
+        Args:
+            centroids (np.ndarray): (n_lists, dim) list centroids
+            assignments (np.ndarray): List of each gallery row
+            metric (str, optional): "l2" or "cosine", the space the
+                centroids were trained in. Defaults to "l2".
+            n_probe (int, optional): Lists searched per query. Defaults to 8.
+            trained_count (int, optional): Rows the centroids were trained
+                on. Defaults to the number of rows.
+        """
+        self.centroids = np.ascontiguousarray(centroids, dtype=np.float32)
+        self.metric = metric
+        self.n_probe = n_probe
+        self.trained_count = trained_count if trained_count is not None else len(assignments)
+        self._set_assignments(np.asarray(assignments, dtype=np.int32))
+
+    def _set_assignments(self, assignments):
+        self.assignments = assignments
+        # Rows grouped by list: rows of list i are order[offsets[i]:offsets[i + 1]]
+        self.order = np.argsort(assignments, kind="stable").astype(np.int32)
+        counts = np.bincount(assignments, minlength=len(self.centroids))
+        self.offsets = np.concatenate([[0], np.cumsum(counts)])
+
+    def __len__(self):
+        return len(self.assignments)
+
+    @staticmethod
+    def _space(matrix, metric):
+        """Vectors as the index sees them, normalized for cosine"""
+        matrix = np.asarray(matrix, dtype=np.float32)
+        if metric == "cosine":
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            matrix = matrix / np.maximum(norms, 1e-12)
+        return matrix
+
+    @staticmethod
+    def _nearest(vectors, centroids):
+        """Index of the closest centroid of each vector"""
+        distances = (
+            np.einsum("ij,ij->i", centroids, centroids)[None, :]
+            - 2.0 * (vectors @ centroids.T)
+        )
+        return np.argmin(distances, axis=1).astype(np.int32)
+
+    @classmethod
+    def train(cls, encodings, metric="l2", n_lists=None, n_probe=8, iterations=10, seed=0):
+        """Build an index with Lloyd's k-means
+
+        Args:
+            encodings (np.ndarray): (n, dim) gallery rows
+            n_lists (int, optional): Number of lists. Defaults to sqrt(n).
+
+        Returns:
+            IvfIndex
+        """
+        vectors = cls._space(encodings, metric)
+        n_lists = n_lists or max(int(np.sqrt(len(vectors))), 1)
+        n_lists = min(n_lists, len(vectors))
+        rng = np.random.default_rng(seed)
+        centroids = vectors[rng.choice(len(vectors), n_lists, replace=False)].copy()
+        for _ in range(iterations):
+            assignments = cls._nearest(vectors, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignments, vectors)
+            counts = np.bincount(assignments, minlength=n_lists)
+            filled = counts > 0
+            centroids[filled] = sums[filled] / counts[filled, None]
+            if metric == "cosine":
+                centroids = cls._space(centroids, metric)
+        assignments = cls._nearest(vectors, centroids)
+        return cls(centroids, assignments, metric=metric, n_probe=n_probe)
+
+    def add(self, encodings):
+        """Assign new rows to the existing lists without retraining"""
+        if len(encodings) == 0:
+            return
+        new = self._nearest(self._space(encodings, self.metric), self.centroids)
+        self._set_assignments(np.concatenate([self.assignments, new]))
+
+    def probe(self, queries):
+        """Lists worth searching for each query
+
+        Returns:
+            np.ndarray: (queries, n_probe) list indexes
+        """
+        vectors = self._space(queries, self.metric).reshape(len(queries), -1)
+        distances = (
+            np.einsum("ij,ij->i", self.centroids, self.centroids)[None, :]
+            - 2.0 * (vectors @ self.centroids.T)
+        )
+        n_probe = min(self.n_probe, len(self.centroids))
+        return np.argpartition(distances, n_probe - 1, axis=1)[:, :n_probe]
+
+    # -- Persistence -- #
+    def save(self, path, generation):
+        tmp_path = path + ".tmp.npz"
+        np.savez(
+            tmp_path,
+            format_version=self.FORMAT_VERSION,
+            centroids=self.centroids,
+            assignments=self.assignments,
+            metric=self.metric,
+            generation=generation,
+            trained_count=self.trained_count,
+        )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path, n_probe=8):
+        """Returns:
+            (IvfIndex, int): Index and the store generation it was built for
+        """
+        with np.load(path) as data:
+            if int(data["format_version"]) != cls.FORMAT_VERSION:
+                raise ValueError(f"Unsupported index version {data['format_version']}")
+            index = cls(
+                data["centroids"],
+                data["assignments"],
+                metric=str(data["metric"]),
+                n_probe=n_probe,
+                trained_count=int(data["trained_count"]),
+            )
+            return index, int(data["generation"])
+
+
+class IvfIndexBuilder:
+
+    def __init__(self, store_dir, metric="l2", n_lists=None, n_probe=8, min_rows=2500):
+        """Keeps an IvfIndex in step with the embedding store, saved next to
+        it as ivf.<generation>.npz
+
+        Rows appended to the store are added to the saved index. The index
+        is retrained when the store was rewritten, the metric changed, or
+        the gallery doubled since the centroids were trained.
+
+        Args:
+            store_dir (Path): Embedding store directory
+            metric (str, optional): Matching metric. Defaults to "l2".
+            n_lists (int, optional): Lists per index. Defaults to sqrt(rows).
+            n_probe (int, optional): Lists searched per query. Defaults to 8.
+            min_rows (int, optional): Smaller galleries are searched exactly,
+                which is faster for them. Defaults to 2500.
+        """
+        self.store_dir = store_dir
+        self.metric = metric
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.min_rows = min_rows
+
+    def _path(self, generation):
+        return os.path.join(self.store_dir, f"ivf.{generation}.npz")
+
+    def _remove_stale(self, generation):
+        keep = self._path(generation)
+        for path in glob.glob(os.path.join(self.store_dir, "ivf.*.npz")):
+            if path != keep:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def __call__(self, encodings, header):
+        """Index for the gallery loaded from the store
+
+        Args:
+            encodings (np.ndarray): (count, dim) rows in store order
+            header (dict): Store header they were loaded with
+
+        Returns:
+            IvfIndex: None when the gallery is too small to need one
+        """
+        if header is None or len(encodings) < self.min_rows:
+            return None
+        generation = header["generation"]
+        path = self._path(generation)
+        index = None
+        if os.path.exists(path):
+            try:
+                index, index_generation = IvfIndex.load(path, self.n_probe)
+                if (
+                    index_generation != generation
+                    or index.metric != self.metric
+                    or len(index) > len(encodings)
+                    or len(encodings) > 2 * index.trained_count
+                ):
+                    index = None
+            except (OSError, ValueError, KeyError) as e:
+                logger.error(f"Failed to load face index: {e}")
+                index = None
+        if index is not None and len(index) == len(encodings):
+            return index
+        if index is not None:
+            added = len(encodings) - len(index)
+            index.add(encodings[len(index):])
+            logger.info(f"Added {added} rows to the face index")
+        else:
+            index = IvfIndex.train(
+                encodings, metric=self.metric, n_lists=self.n_lists, n_probe=self.n_probe
+            )
+            logger.info(f"Trained face index, {len(index.centroids)} lists")
+        index.save(path, generation)
+        self._remove_stale(generation)
+        return index
@@ -0,0 +1,377 @@
+import concurrent.futures
+import multiprocessing
+import os
+import numpy as np
+import cv2
+from decouple import config
+from .fr_functions import (
+    logger,
+    initialize_models,
+    FACE_REC_MODEL_NAME,
+    CPU_FACE_REC_MODEL_NAME,
+)
+from .face_aligner import FaceAligner, FaceBatch, clamp_bbox
+
+
+class RecognitionBackend:
+    name = None
+    model_name = None
+
+    def __init__(self, detect_model, recog_model, match_threshold):
+        """Detection and recognition models plus the glue between them
+
+        FacialRecognition runs detect_model and recog_model on its inference
+        workers, so every backend reports the same stats. A backend only says
+        how to read their results and how to cut a face out of a frame.
+
+        Args:
+            detect_model (callable): detect_model(frame) -> detection result
+            recog_model (callable): recog_model(face_input) -> encoding
+                result, may also have predict_batch(face_inputs)
+            match_threshold (float): Largest matching distance for the
+                embeddings of this backend
+        """
+        self.detect_model = detect_model
+        self.recog_model = recog_model
+        self.match_threshold = match_threshold
+
+    def bboxes(self, detect_result):
+        """Returns:
+            [(int, int, int, int),]: (x1, y1, x2, y2) box of each face
+        """
+        return detect_result
+
+    def landmarks(self, detect_result):
+        """Returns:
+            [np.ndarray,]: (5, 2) landmarks of each face, None when the
+            detector gives none
+        """
+        return None
+
+    def face_input(self, frame, bbox):
+        """What recog_model needs for one face. It must not reference
+        frame, which is reused once detection is done. bbox is inside the
+        frame. Defaults to a copy of the box.
+        """
+        x1, y1, x2, y2 = bbox
+        return frame[y1:y2, x1:x2].copy()
+
+    def face_batch(self, frame, bboxes, landmarks=None):
+        """Face inputs of every usable box of a frame. Boxes are clamped to
+        the frame and the ones left too small, or failing to crop, are
+        skipped.
+
+        Returns:
+            FaceBatch
+        """
+        height, width = frame.shape[:2]
+        faces = []
+        indexes = []
+        for box_index, bbox in enumerate(bboxes):
+            clamped = clamp_bbox(bbox, width, height)
+            if clamped is None:
+                continue
+            try:
+                faces.append(self.face_input(frame, clamped))
+            except Exception as e:
+                logger.error(f"Failed cropping face {bbox}: {e}")
+                continue
+            indexes.append(box_index)
+        return FaceBatch(faces, indexes)
+
+    def encoding(self, recog_result):
+        """Returns:
+            np.ndarray: Embedding, None if the face could not be encoded
+        """
+        return recog_result
+
+    def load_image(self, img_path):
+        return cv2.imread(img_path)
+
+    # Enrollment override, encode_images([img_path,]) -> [encoding or None,]
+    encode_images = None
+
+    def close(self):
+        None
+
+
+class HailoBackend(RecognitionBackend):
+    name = "hailo"
+    model_name = FACE_REC_MODEL_NAME
+    _FACE_SIZE = (112, 112)
+
+    def __init__(self, detect_model=None, recog_model=None):
+        """SCRFD detection and ArcFace recognition through DeGirum on the
+        Hailo 8l. The models are loaded when not given.
+        """
+        if detect_model is None or recog_model is None:
+            detect_model, recog_model = initialize_models()
+        super().__init__(
+            detect_model,
+            recog_model,
+            config("FACE_MATCH_THRESHOLD", default=6.0, cast=float),
+        )
+        self.aligner = FaceAligner(
+            self._FACE_SIZE, max_faces=config("ALIGN_MAX_FACES", default=8, cast=int)
+        )
+
+    def bboxes(self, detect_result):
+        return [
+            tuple(map(int, detected_face["bbox"])) for detected_face in detect_result.results
+        ]
+
+    def landmarks(self, detect_result):
+        """SCRFD's five keypoints, as [{"landmark": [x, y], ...},] per face"""
+        faces_landmarks = []
+        for detected_face in detect_result.results:
+            points = detected_face.get("landmarks")
+            faces_landmarks.append(
+                np.array([point["landmark"] for point in points], dtype=np.float32)
+                if points
+                else None
+            )
+        return faces_landmarks
+
+    def load_image(self, img_path):
+        """Enrollment image in the channel order of the camera frames:
+        picamera2's "BGR888" frames are RGB in memory, so the gallery and
+        the live faces reach the models the same way
+        """
+        img = cv2.imread(img_path)
+        if img is None:
+            return None
+        return cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+
+    def face_batch(self, frame, bboxes, landmarks=None):
+        """Aligned 112x112 faces in a reused batch buffer"""
+        return self.aligner.align(frame, bboxes, landmarks)
+
+    def encoding(self, recog_result):
+        if not recog_result:
+            return None
+        return np.array(recog_result.results[0]['data'][0])
+
+
+# -- CPU (face_recognition / dlib) -- #
+def _encode_cpu_face(face_input):
+    import face_recognition
+
+    crop, location = face_input
+    encodings = face_recognition.face_encodings(crop, known_face_locations=[location])
+    return encodings[0] if encodings else None
+
+
+def _encode_cpu_faces(face_inputs):
+    return [_encode_cpu_face(face_input) for face_input in face_inputs]
+
+
+def _encode_image_cpu(img_path):
+    """Encode the face of one enrollment image, run in a worker process
+
+    Returns:
+        np.ndarray: Encoding, None if no face was found
+    """
+    import face_recognition
+
+    try:
+        image = face_recognition.load_image_file(img_path)
+        encodings = face_recognition.face_encodings(image)
+    except Exception as e:
+        logger.error(f"Failed to encode {img_path}: {e}")
+        return None
+    # Assuming only one face in learning image
+    return encodings[0] if encodings else None
+
+
+def _process_pool(max_workers):
+    """Worker processes started with spawn. Forking would copy the camera,
+    pygame and the threads running in the mirror into each worker.
+    """
+    return concurrent.futures.ProcessPoolExecutor(
+        max_workers=max_workers, mp_context=multiprocessing.get_context("spawn")
+    )
+
+
+def _encode_images_cpu(img_paths):
+    if not img_paths:
+        return []
+    workers = config("ENROLL_WORKERS", default=os.cpu_count() or 1, cast=int)
+    with _process_pool(workers) as executor:
+        return list(executor.map(_encode_image_cpu, img_paths))
+
+
+class HogFaceDetector:
+    model_name = "hog_face_detector"
+
+    def __init__(self, scale=0.5, upsample=1):
+        """HOG face detection on a shrunk frame, boxes scaled back up
+
+        Args:
+            scale (float, optional): Frame scale detection runs at.
+                Defaults to 0.5.
+            upsample (int, optional): dlib upsampling passes, finds smaller
+                faces at a cost. Defaults to 1.
+        """
+        self.scale = scale
+        self.upsample = upsample
+
+    def __call__(self, frame):
+        import face_recognition
+
+        small = cv2.resize(
+            frame, None, fx=self.scale, fy=self.scale, interpolation=cv2.INTER_AREA
+        )
+        locations = face_recognition.face_locations(
+            small, number_of_times_to_upsample=self.upsample, model="hog"
+        )
+        return [
+            (
+                int(left / self.scale),
+                int(top / self.scale),
+                int(right / self.scale),
+                int(bottom / self.scale),
+            )
+            for top, right, bottom, left in locations
+        ]
+
+
+class DlibFaceEncoder:
+    model_name = CPU_FACE_REC_MODEL_NAME
+
+    def __init__(self, use_process=False):
+        """dlib ResNet encoding of already located faces
+
+        Args:
+            use_process (bool, optional): Encode in a worker process so the
+                render loop keeps the interpreter. Defaults to False.
+        """
+        self._executor = _process_pool(1) if use_process else None
+
+    def __call__(self, face_input):
+        return self.predict_batch([face_input])[0]
+
+    def predict_batch(self, face_inputs):
+        if self._executor is not None:
+            return self._executor.submit(_encode_cpu_faces, face_inputs).result()
+        return _encode_cpu_faces(face_inputs)
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+class CpuBackend(RecognitionBackend):
+    name = "cpu"
+    model_name = CPU_FACE_REC_MODEL_NAME
+    _MARGIN = 0.25
+
+    def __init__(self, detect_scale=0.5, upsample=1, use_process=False):
+        """face_recognition on the CPU, tuned for units without an
+        accelerator: detection on a shrunk frame and encoding of the
+        detected regions only
+
+        Args:
+            detect_scale (float, optional): See HogFaceDetector
+            upsample (int, optional): See HogFaceDetector
+            use_process (bool, optional): See DlibFaceEncoder
+        """
+        super().__init__(
+            HogFaceDetector(detect_scale, upsample),
+            DlibFaceEncoder(use_process),
+            # face_recognition's own compare_faces tolerance
+            config("CPU_FACE_MATCH_THRESHOLD", default=0.6, cast=float),
+        )
+
+    def face_input(self, frame, bbox):
+        """The face with a margin for dlib's landmarks, and the face's
+        location inside that crop as (top, right, bottom, left)
+        """
+        x1, y1, x2, y2 = bbox
+        margin_x = int((x2 - x1) * self._MARGIN)
+        margin_y = int((y2 - y1) * self._MARGIN)
+        height, width = frame.shape[:2]
+        crop_x1, crop_y1 = max(x1 - margin_x, 0), max(y1 - margin_y, 0)
+        crop_x2, crop_y2 = min(x2 + margin_x, width), min(y2 + margin_y, height)
+        crop = np.ascontiguousarray(frame[crop_y1:crop_y2, crop_x1:crop_x2])
+        return crop, (y1 - crop_y1, x2 - crop_x1, y2 - crop_y1, x1 - crop_x1)
+
+    def encode_images(self, img_paths):
+        return _encode_images_cpu(img_paths)
+
+    def close(self):
+        self.recog_model.close()
+
+
+# -- Stub -- #
+class StubFaceDetector:
+    model_name = "stub_detector"
+
+    # Above JPEG noise around a face
+    _THRESHOLD = 16
+
+    def __call__(self, frame):
+        """Every solid non-black region is a face, left to right"""
+        mask = (frame.max(axis=2) if frame.ndim == 3 else frame) > self._THRESHOLD
+        contours, _ = cv2.findContours(
+            mask.astype(np.uint8), cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE
+        )
+        boxes = []
+        for contour in contours:
+            x, y, w, h = cv2.boundingRect(contour)
+            boxes.append((x, y, x + w, y + h))
+        return sorted(boxes)
+
+
+class StubFaceEncoder:
+    model_name = "stub_encoder"
+    EMBEDDING_SIZE = 128
+
+    # Gray levels closer than this share an identity, so faces survive a
+    # JPEG round trip through the enrollment images
+    _LEVEL_STEP = 16
+
+    def __call__(self, face):
+        """Same embedding for every face painted in the same gray level"""
+        level = int(round(float(np.median(face)) / self._LEVEL_STEP))
+        rng = np.random.default_rng(level)
+        return rng.normal(size=self.EMBEDDING_SIZE).astype(np.float32)
+
+    def predict_batch(self, faces):
+        for face in faces:
+            yield self(face)
+
+
+class StubBackend(RecognitionBackend):
+    name = "stub"
+    model_name = "stub"
+
+    def __init__(self):
+        """Deterministic backend without hardware or model files, for tests
+        and CI: faces are flat gray squares on black, and a face's embedding
+        is seeded by its gray level. Paint faces at least 16 levels apart.
+        """
+        super().__init__(StubFaceDetector(), StubFaceEncoder(), match_threshold=1.0)
+
+
+def make_backend(name, detect_model=None, recog_model=None):
+    """Build the backend named by a RECOGNITION_BACKEND setting
+
+    Args:
+        name (str): "hailo", "cpu" or "stub"
+        detect_model (callable, optional): Hailo detection model to use
+        recog_model (callable, optional): Hailo recognition model to use
+
+    Returns:
+        RecognitionBackend
+    """
+    if name == "hailo":
+        return HailoBackend(detect_model, recog_model)
+    if name == "cpu":
+        return CpuBackend(
+            detect_scale=config("CPU_DETECT_SCALE", default=0.5, cast=float),
+            upsample=config("CPU_DETECT_UPSAMPLE", default=1, cast=int),
+            use_process=config("CPU_ENCODE_PROCESS", default=False, cast=bool),
+        )
+    if name == "stub":
+        return StubBackend()
+    raise ValueError(f"Unknown recognition backend {name}")
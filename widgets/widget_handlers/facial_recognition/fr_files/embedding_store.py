@@ -0,0 +1,249 @@
+import json
+import os
+import numpy as np
+from .fr_functions import logger
+
+
+class EmbeddingStore:
+    FORMAT_VERSION = 1
+    _HEADER = "header.json"
+
+    def __init__(self, store_dir):
+        """Versioned, append-only binary store of face embeddings
+
+        The store is a directory holding:
+            header.json              format version, model, dim (null while
+                                     empty), row count, generation and
+                                     committed index size
+            embeddings.<gen>.f32     (count, dim) little-endian float32 rows,
+                                     memory-mappable
+            index.<gen>.jsonl        one {"name", "image_hash", "path"} per row
+
+        The header is replaced atomically and is the commit point. Rows or
+        index lines past what it records are left over from an interrupted
+        write, so they are ignored on load and truncated on the next append.
+
+        Args:
+            store_dir (Path): Directory of the store
+        """
+        self.store_dir = store_dir
+        self.header_path = os.path.join(store_dir, self._HEADER)
+
+    # -- Files -- #
+    def _embeddings_path(self, generation):
+        return os.path.join(self.store_dir, f"embeddings.{generation}.f32")
+
+    def _index_path(self, generation):
+        return os.path.join(self.store_dir, f"index.{generation}.jsonl")
+
+    def _fsync_dir(self):
+        try:
+            dir_fd = os.open(self.store_dir, os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            os.fsync(dir_fd)
+        except OSError:
+            pass
+        finally:
+            os.close(dir_fd)
+
+    def _write_header(self, header):
+        tmp_path = self.header_path + ".tmp"
+        with open(tmp_path, "w") as header_file:
+            json.dump(header, header_file)
+            header_file.flush()
+            os.fsync(header_file.fileno())
+        os.replace(tmp_path, self.header_path)
+        self._fsync_dir()
+
+    def _append_file(self, path, committed_size, data):
+        """Truncate uncommitted bytes, append data and fsync
+
+        Returns:
+            int: New committed size
+        """
+        with open(path, "ab") as data_file:
+            data_file.truncate(committed_size)
+            data_file.write(data)
+            data_file.flush()
+            os.fsync(data_file.fileno())
+        return committed_size + len(data)
+
+    def _encode_rows(self, names, image_hashes, paths):
+        lines = [
+            json.dumps({"name": name, "image_hash": image_hash, "path": path}) + "\n"
+            for name, image_hash, path in zip(names, image_hashes, paths)
+        ]
+        return "".join(lines).encode("utf-8")
+
+    def _as_matrix(self, encodings, dim=None):
+        matrix = np.ascontiguousarray(encodings, dtype="<f4")
+        if matrix.ndim == 1:
+            matrix = matrix.reshape(1, -1) if matrix.size else matrix.reshape(0, dim or 0)
+        if dim is not None and matrix.shape[1] != dim:
+            raise ValueError(f"Embedding dim {matrix.shape[1]} does not match store dim {dim}")
+        return matrix
+
+    # -- Reading -- #
+    def exists(self):
+        return os.path.exists(self.header_path)
+
+    def read_header(self):
+        """Returns:
+            dict: Header, None if the store was never written
+        """
+        try:
+            with open(self.header_path, "r") as header_file:
+                header = json.load(header_file)
+        except FileNotFoundError:
+            return None
+        if header.get("format_version") != self.FORMAT_VERSION:
+            raise ValueError(
+                f"Unsupported embedding store version {header.get('format_version')}"
+            )
+        return header
+
+    def version(self):
+        """Cheap change marker: the header's mtime and size, None if missing"""
+        try:
+            stat = os.stat(self.header_path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def load_index(self, header=None):
+        """Returns:
+            [dict,]: {"name", "image_hash", "path"} of each committed row
+        """
+        header = header or self.read_header()
+        if header is None or header["count"] == 0:
+            return []
+        with open(self._index_path(header["generation"]), "rb") as index_file:
+            data = index_file.read(header["index_bytes"])
+        return [json.loads(line) for line in data.decode("utf-8").splitlines()]
+
+    def load(self):
+        """Load the committed rows
+
+        Returns:
+            (np.ndarray, [dict,], dict): Memory-mapped (count, dim) float32
+            matrix, index entries and header. (None, [], None) if empty.
+        """
+        header = self.read_header()
+        if header is None:
+            return None, [], None
+        count, dim = header["count"], header["dim"]
+        if count == 0:
+            return np.zeros((0, dim or 0), dtype=np.float32), [], header
+        encodings = np.memmap(
+            self._embeddings_path(header["generation"]),
+            dtype="<f4",
+            mode="r",
+            shape=(count, dim),
+        )
+        return encodings, self.load_index(header), header
+
+    # -- Writing -- #
+    def append(self, encodings, names, image_hashes, paths, model):
+        """Append rows without rewriting the existing ones. An empty store
+        is rewritten instead, taking its dim from the new rows.
+
+        Args:
+            encodings (np.ndarray): (n, dim) embeddings
+            names ([str,]): Person of each row
+            image_hashes ([str,]): Content hash of the source image of each row
+            paths ([str,]): Source image path of each row
+            model (str): Model that produced the embeddings
+        """
+        header = self.read_header()
+        if header is None or header["count"] == 0:
+            self.rewrite(encodings, names, image_hashes, paths, model)
+            return
+        if header["model"] != model:
+            raise ValueError(
+                f"Store holds {header['model']} embeddings, cannot append {model}"
+            )
+        matrix = self._as_matrix(encodings, header["dim"])
+        if len(matrix) == 0:
+            return
+        generation = header["generation"]
+        self._append_file(
+            self._embeddings_path(generation),
+            header["count"] * header["dim"] * 4,
+            matrix.tobytes(),
+        )
+        header["index_bytes"] = self._append_file(
+            self._index_path(generation),
+            header["index_bytes"],
+            self._encode_rows(names, image_hashes, paths),
+        )
+        header["count"] += len(matrix)
+        self._write_header(header)
+
+    def rewrite(self, encodings, names, image_hashes, paths, model):
+        """Replace the whole store with the given rows. The new generation is
+        written next to the old one and committed by the header swap.
+        """
+        os.makedirs(self.store_dir, exist_ok=True)
+        old_header = self.read_header()
+        generation = old_header["generation"] + 1 if old_header else 1
+        matrix = self._as_matrix(encodings)
+        # An empty store has no dim yet, the first rows appended set it
+        dim = int(matrix.shape[1]) if len(matrix) else None
+        embeddings_path = self._embeddings_path(generation)
+        index_path = self._index_path(generation)
+        for path in (embeddings_path, index_path):
+            if os.path.exists(path):
+                os.remove(path)
+        self._append_file(embeddings_path, 0, matrix.tobytes())
+        index_bytes = self._append_file(
+            index_path, 0, self._encode_rows(names, image_hashes, paths)
+        )
+        self._write_header(
+            {
+                "format_version": self.FORMAT_VERSION,
+                "model": model,
+                "dim": dim,
+                "count": len(matrix),
+                "generation": generation,
+                "index_bytes": index_bytes,
+            }
+        )
+        if old_header:
+            for path in (
+                self._embeddings_path(old_header["generation"]),
+                self._index_path(old_header["generation"]),
+            ):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+    def migrate_from_json(self, json_path, model):
+        """One-time import of a legacy known_faces.json. Does nothing if the
+        store already exists, there is no json file or it holds no faces.
+
+        Returns:
+            bool: True if rows were migrated
+        """
+        if self.exists() or not os.path.exists(json_path):
+            return False
+        with open(json_path, "r") as json_data:
+            known_data = json.load(json_data)
+        names = known_data.get("known_names") or []
+        encodings = known_data.get("known_encodings") or []
+        if len(names) == 0 or len(encodings) == 0:
+            # Written when no face could be encoded, leave the store to be
+            # learned from the images instead
+            logger.info(f"Nothing to migrate from {json_path}")
+            return False
+        self.rewrite(
+            np.asarray(encodings, dtype=np.float32).reshape(len(names), -1),
+            names,
+            [None] * len(names),
+            [None] * len(names),
+            model,
+        )
+        logger.info(f"Migrated {len(names)} encodings from {json_path}")
+        return True
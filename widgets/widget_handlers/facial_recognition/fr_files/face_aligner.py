@@ -0,0 +1,194 @@
+import threading
+import numpy as np
+import cv2
+from .fr_functions import logger
+
+# ArcFace's five reference points (eyes, nose, mouth corners) in a 112x112 crop
+ARCFACE_LANDMARKS = np.array(
+    [
+        [38.2946, 51.6963],
+        [73.5318, 51.5014],
+        [56.0252, 71.7366],
+        [41.5493, 92.3655],
+        [70.7299, 92.2041],
+    ],
+    dtype=np.float32,
+)
+
+
+def clamp_bbox(bbox, width, height, min_size=8):
+    """Clip a face box to the frame
+
+    Args:
+        bbox ((int, int, int, int)): (x1, y1, x2, y2) box, may reach past
+            the frame edges
+        width (int): Frame width
+        height (int): Frame height
+        min_size (int, optional): Smallest side worth recognizing.
+            Defaults to 8.
+
+    Returns:
+        (int, int, int, int): Box inside the frame, None if what is left is
+        smaller than min_size
+    """
+    x1, y1, x2, y2 = (int(round(value)) for value in bbox)
+    x1, x2 = max(x1, 0), min(x2, width)
+    y1, y2 = max(y1, 0), min(y2, height)
+    if x2 - x1 < min_size or y2 - y1 < min_size:
+        return None
+    return x1, y1, x2, y2
+
+
+def similarity_transform(src, dst):
+    """Least-squares rotation, uniform scale and translation taking the src
+    points onto the dst points (Umeyama)
+
+    Returns:
+        np.ndarray: (2, 3) affine matrix, None if src is degenerate
+    """
+    src = np.asarray(src, dtype=np.float64)
+    dst = np.asarray(dst, dtype=np.float64)
+    src_mean, dst_mean = src.mean(axis=0), dst.mean(axis=0)
+    src_centered, dst_centered = src - src_mean, dst - dst_mean
+    src_var = (src_centered ** 2).sum() / len(src)
+    if src_var < 1e-6:
+        return None
+    u, s, vt = np.linalg.svd(dst_centered.T @ src_centered / len(src))
+    d = np.array([1.0, 1.0 if np.linalg.det(u) * np.linalg.det(vt) >= 0 else -1.0])
+    rotation = u @ np.diag(d) @ vt
+    scale = (s * d).sum() / src_var
+    matrix = np.empty((2, 3))
+    matrix[:, :2] = scale * rotation
+    matrix[:, 2] = dst_mean - scale * rotation @ src_mean
+    return matrix
+
+
+class FaceBatch:
+
+    def __init__(self, faces, indexes, release_func=None):
+        """Face inputs of one frame, ready for batched recognition
+
+        Args:
+            faces: Sequence of face inputs, a view of a pooled buffer when
+                built by FaceAligner
+            indexes ([int,]): Index of the box each face was cut from, boxes
+                that were skipped are missing
+            release_func (callable, optional): Hands the buffer back
+        """
+        self.faces = faces
+        self.indexes = indexes
+        self._release_func = release_func
+
+    def __len__(self):
+        return len(self.indexes)
+
+    def release(self):
+        """Return the buffer to its pool. The faces must not be used after."""
+        if self._release_func is not None:
+            self._release_func()
+            self._release_func = None
+
+
+class FaceAligner:
+
+    def __init__(self, size=(112, 112), max_faces=8, min_size=8, template=ARCFACE_LANDMARKS):
+        """Cuts faces into pooled, preallocated (max_faces, h, w, c) batch
+        buffers, aligned on their landmarks when the detector gives them
+
+        Buffers are reused once released, so steady-state frames allocate no
+        image memory. A buffer is only allocated when every one is in use or
+        a frame holds more than max_faces faces.
+
+        Args:
+            size ((int, int), optional): (width, height) of each face.
+                Defaults to (112, 112).
+            max_faces (int, optional): Faces per buffer. Defaults to 8.
+            min_size (int, optional): See clamp_bbox. Defaults to 8.
+            template (np.ndarray, optional): Landmark positions in a 112x112
+                crop. Defaults to ARCFACE_LANDMARKS.
+        """
+        self.size = size
+        self.max_faces = max_faces
+        self.min_size = min_size
+        self.template = template * np.array(
+            [size[0] / 112.0, size[1] / 112.0], dtype=np.float32
+        )
+        self._free = []
+        self._lock = threading.Lock()
+        self._counters = {"batches": 0, "aligned": 0, "resized": 0, "skipped": 0, "buffers": 0}
+
+    def _acquire(self, count, tail_shape, dtype):
+        shape = (max(count, self.max_faces), self.size[1], self.size[0]) + tail_shape
+        with self._lock:
+            for i, buffer in enumerate(self._free):
+                if buffer.shape[0] >= count and buffer.shape[1:] == shape[1:] and buffer.dtype == dtype:
+                    return self._free.pop(i)
+            self._counters["buffers"] += 1
+        return np.empty(shape, dtype=dtype)
+
+    def _release(self, buffer):
+        with self._lock:
+            self._free.append(buffer)
+
+    def _write_face(self, frame, bbox, landmarks, out):
+        """Warp or resize one face into out
+
+        Returns:
+            bool: True if the face was aligned on its landmarks
+        """
+        if landmarks is not None and len(landmarks) == len(self.template):
+            matrix = similarity_transform(landmarks, self.template)
+            if matrix is not None:
+                cv2.warpAffine(
+                    frame, matrix, self.size, dst=out, borderMode=cv2.BORDER_REPLICATE
+                )
+                return True
+        x1, y1, x2, y2 = bbox
+        cv2.resize(frame[y1:y2, x1:x2], self.size, dst=out)
+        return False
+
+    def align(self, frame, bboxes, landmarks=None):
+        """Cut every usable face of a frame into one batch buffer
+
+        Boxes are clamped to the frame. Boxes left too small, and faces that
+        fail to crop, are skipped on their own instead of failing the frame.
+
+        Args:
+            frame (np.ndarray): Frame the faces were detected in
+            bboxes ([(int, int, int, int),]): Face boxes
+            landmarks ([np.ndarray,], optional): (5, 2) landmarks of each
+                box, or None where there are none
+
+        Returns:
+            FaceBatch: Faces that do not reference frame. Release it once
+            recognition is done.
+        """
+        height, width = frame.shape[:2]
+        buffer = self._acquire(len(bboxes), frame.shape[2:], frame.dtype)
+        indexes = []
+        aligned = 0
+        for box_index, bbox in enumerate(bboxes):
+            clamped = clamp_bbox(bbox, width, height, self.min_size)
+            if clamped is None:
+                continue
+            face_landmarks = landmarks[box_index] if landmarks is not None else None
+            try:
+                aligned += self._write_face(frame, clamped, face_landmarks, buffer[len(indexes)])
+            except Exception as e:
+                logger.error(f"Failed cropping face {bbox}: {e}")
+                continue
+            indexes.append(box_index)
+        with self._lock:
+            self._counters["batches"] += 1
+            self._counters["aligned"] += aligned
+            self._counters["resized"] += len(indexes) - aligned
+            self._counters["skipped"] += len(bboxes) - len(indexes)
+        return FaceBatch(buffer[:len(indexes)], indexes, lambda: self._release(buffer))
+
+    def stats(self):
+        """Returns:
+            dict: Batches built, faces aligned on landmarks, faces resized
+            from their box, boxes skipped and buffers allocated
+        """
+        with self._lock:
+            return dict(self._counters)
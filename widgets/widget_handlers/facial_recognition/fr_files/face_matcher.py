@@ -0,0 +1,221 @@
+from collections import namedtuple
+import numpy as np
+
+# name is "unknown" when the best distance is not under the threshold.
+# candidates holds the top_k (name, distance) pairs, closest first.
+FaceMatch = namedtuple("FaceMatch", ["name", "distance", "candidates"])
+
+
+class FaceMatcher:
+    METRICS = ("l2", "cosine")
+    AGGREGATIONS = ("best", "centroid")
+    UNKNOWN = "unknown"
+
+    def __init__(self, threshold, metric="l2", aggregation="best", top_k=3):
+        """Matches face encodings against every identity of a gallery at once
+
+        Args:
+            threshold (float): Largest distance still counted as a match
+            metric (str, optional): "l2" on the raw embeddings or "cosine"
+                (1 - cosine similarity) on normalized ones. Defaults to "l2".
+            aggregation (str, optional): "best" scores an identity by its
+                closest image, "centroid" by the mean of its images.
+                Defaults to "best".
+            top_k (int, optional): Candidates kept per face. Defaults to 3.
+        """
+        if metric not in self.METRICS:
+            raise ValueError(f"Unknown metric {metric}, expected one of {self.METRICS}")
+        if aggregation not in self.AGGREGATIONS:
+            raise ValueError(
+                f"Unknown aggregation {aggregation}, expected one of {self.AGGREGATIONS}"
+            )
+        self.threshold = threshold
+        self.metric = metric
+        self.aggregation = aggregation
+        self.top_k = top_k
+        self._prepared_for = None
+        self._prepared = None
+        self._indexed_for = None
+        self._indexed = None
+
+    def _normalize(self, matrix):
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        return matrix / np.maximum(norms, 1e-12)
+
+    def _prepare(self, gallery):
+        """Group, aggregate and normalize the gallery once per gallery object
+
+        Returns:
+            (np.ndarray, np.ndarray, [str,], np.ndarray, np.ndarray,
+            np.ndarray): Gallery matrix, its squared row norms, identity
+            names, the first row of each identity (None for centroids, one
+            row per identity), and the gallery rows in store order with the
+            identity of each, for the approximate index
+        """
+        if gallery is self._prepared_for:
+            return self._prepared
+        encodings = np.asarray(gallery.encodings, dtype=np.float32)
+        identities, identity_ids = np.unique(
+            np.asarray(list(gallery.names), dtype=str), return_inverse=True
+        )
+        if self.metric == "cosine":
+            encodings = self._normalize(encodings)
+
+        if self.aggregation == "centroid":
+            matrix = np.zeros((len(identities), encodings.shape[1]), dtype=np.float32)
+            np.add.at(matrix, identity_ids, encodings)
+            matrix /= np.bincount(identity_ids)[:, None]
+            if self.metric == "cosine":
+                matrix = self._normalize(matrix)
+            starts = None
+        else:
+            order = np.argsort(identity_ids, kind="stable")
+            matrix = encodings[order]
+            starts = np.searchsorted(identity_ids[order], np.arange(len(identities)))
+
+        matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+        sq_norms = np.einsum("ij,ij->i", matrix, matrix)
+        self._prepared = (
+            matrix,
+            sq_norms,
+            identities.tolist(),
+            starts,
+            np.ascontiguousarray(encodings, dtype=np.float32),
+            identity_ids,
+        )
+        self._prepared_for = gallery
+        return self._prepared
+
+    def distances(self, face_encodings, gallery):
+        """Distance of every face to every identity in one matrix operation
+
+        Args:
+            face_encodings ([np.ndarray,]): Encodings of the faces in a frame
+            gallery (Gallery): Known faces
+
+        Returns:
+            (np.ndarray, [str,]): (faces x identities) distances and the
+            identity name of each column
+        """
+        matrix, sq_norms, identities, starts, _, _ = self._prepare(gallery)
+        faces = np.asarray(face_encodings, dtype=np.float32).reshape(
+            len(face_encodings), -1
+        )
+        if self.metric == "cosine":
+            distances = 1.0 - self._normalize(faces) @ matrix.T
+        else:
+            face_sq_norms = np.einsum("ij,ij->i", faces, faces)
+            distances = face_sq_norms[:, None] + sq_norms[None, :] - 2.0 * (faces @ matrix.T)
+            distances = np.sqrt(np.maximum(distances, 0.0))
+        if starts is not None:
+            distances = np.minimum.reduceat(distances, starts, axis=1)
+        return distances, identities
+
+    def _uses_index(self, gallery):
+        index = getattr(gallery, "index", None)
+        return index is not None and self.aggregation == "best" and index.metric == self.metric
+
+    def _match_candidates(self, identities, identity_ids, distances):
+        """FaceMatch from the distances of one face to some gallery rows"""
+        if len(distances) == 0:
+            return FaceMatch(self.UNKNOWN, float("inf"), [])
+        # Closest row of each identity among the candidates
+        order = np.lexsort((distances, identity_ids))
+        ids, first = np.unique(identity_ids[order], return_index=True)
+        best = distances[order][first]
+        closest = np.argsort(best)[: self.top_k]
+        candidates = [(identities[ids[i]], float(best[i])) for i in closest]
+        best_name, best_distance = candidates[0]
+        if best_distance >= self.threshold:
+            best_name = self.UNKNOWN
+        return FaceMatch(best_name, best_distance, candidates)
+
+    def _prepare_index(self, gallery):
+        """Gallery rows regrouped so each index list is one contiguous block,
+        searched in place without gathering rows
+
+        Returns:
+            (np.ndarray, np.ndarray, np.ndarray, [str,]): Rows in list order,
+            their squared norms, their identity ids and the identity names
+        """
+        if gallery is self._indexed_for:
+            return self._indexed
+        _, _, identities, _, vectors, identity_ids = self._prepare(gallery)
+        order = gallery.index.order
+        list_vectors = np.ascontiguousarray(vectors[order])
+        self._indexed = (
+            list_vectors,
+            np.einsum("ij,ij->i", list_vectors, list_vectors),
+            identity_ids[order],
+            identities,
+        )
+        self._indexed_for = gallery
+        return self._indexed
+
+    def _match_index(self, face_encodings, gallery):
+        """Match against only the index lists closest to each face"""
+        list_vectors, list_sq_norms, list_ids, identities = self._prepare_index(gallery)
+        offsets = gallery.index.offsets
+        faces = np.asarray(face_encodings, dtype=np.float32).reshape(
+            len(face_encodings), -1
+        )
+        if self.metric == "cosine":
+            faces = self._normalize(faces)
+        matches = []
+        for face, lists in zip(faces, gallery.index.probe(faces)):
+            distances = []
+            ids = []
+            for i in lists:
+                start, end = offsets[i], offsets[i + 1]
+                if start == end:
+                    continue
+                products = list_vectors[start:end] @ face
+                if self.metric == "cosine":
+                    distances.append(1.0 - products)
+                else:
+                    distances.append(list_sq_norms[start:end] - 2.0 * products)
+                ids.append(list_ids[start:end])
+            if not distances:
+                matches.append(FaceMatch(self.UNKNOWN, float("inf"), []))
+                continue
+            distances = np.concatenate(distances)
+            if self.metric == "l2":
+                distances = np.sqrt(np.maximum(distances + face @ face, 0.0))
+            matches.append(self._match_candidates(identities, np.concatenate(ids), distances))
+        return matches
+
+    def match(self, face_encodings, gallery):
+        """Match each face to its closest identity. Galleries with an
+        approximate index are only searched where the index points.
+
+        Args:
+            face_encodings ([np.ndarray,]): Encodings of the faces in a frame
+            gallery (Gallery): Known faces
+
+        Returns:
+            [FaceMatch,]: One match per face, in order
+        """
+        if len(face_encodings) == 0:
+            return []
+        if len(gallery) == 0:
+            return [FaceMatch(self.UNKNOWN, float("inf"), []) for _ in face_encodings]
+        if self._uses_index(gallery):
+            return self._match_index(face_encodings, gallery)
+        distances, identities = self.distances(face_encodings, gallery)
+        top_k = min(self.top_k, len(identities))
+        matches = []
+        for face_distances in distances:
+            closest = np.argpartition(face_distances, top_k - 1)[:top_k]
+            closest = closest[np.argsort(face_distances[closest])]
+            candidates = [(identities[i], float(face_distances[i])) for i in closest]
+            best_name, best_distance = candidates[0]
+            if best_distance >= self.threshold:
+                best_name = self.UNKNOWN
+            matches.append(FaceMatch(best_name, best_distance, candidates))
+        return matches
+
+    def match_names(self, face_encodings, gallery):
+        """Returns:
+            [str,]: Name of each face, "unknown" where nothing matched
+        """
+        return [match.name for match in self.match(face_encodings, gallery)]
@@ -0,0 +1,181 @@
+import threading
+import time
+import numpy as np
+
+
+class Track:
+    __slots__ = ("track_id", "bbox", "name", "distance", "verified_at", "requested_at", "misses")
+
+    def __init__(self, track_id, bbox):
+        """A face followed across frames
+
+        Attributes:
+            name (str): Identity from the last recognition, None until the
+                first one comes back
+            distance (float): Match distance of that recognition
+            verified_at (float): When the identity was last recognized
+            requested_at (float): When recognition was last asked for
+            misses (int): Detection passes in a row without this face
+        """
+        self.track_id = track_id
+        self.bbox = bbox
+        self.name = None
+        self.distance = float("inf")
+        self.verified_at = None
+        self.requested_at = None
+        self.misses = 0
+
+
+def iou_matrix(boxes_a, boxes_b):
+    """Intersection over union of every box in boxes_a with every box in
+    boxes_b, boxes as (x1, y1, x2, y2)
+
+    Returns:
+        np.ndarray: (len(boxes_a), len(boxes_b)) IoU values
+    """
+    a = np.asarray(boxes_a, dtype=np.float32).reshape(-1, 4)
+    b = np.asarray(boxes_b, dtype=np.float32).reshape(-1, 4)
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    intersection = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    union = area_a[:, None] + area_b[None, :] - intersection
+    return intersection / np.maximum(union, 1e-6)
+
+
+class FaceTracker:
+    UNKNOWN = "unknown"
+
+    def __init__(
+        self,
+        confident_distance,
+        iou_threshold=0.3,
+        max_misses=5,
+        reverify_seconds=5.0,
+        retry_seconds=0.5,
+        clock=time.monotonic,
+    ):
+        """IoU tracker that remembers who each face is, so a person who
+        stays in view is only recognized again now and then
+
+        A face is sent to recognition when its track is new, when the last
+        match was unknown or weaker than confident_distance (at most every
+        retry_seconds), or when the identity is older than reverify_seconds.
+
+        Args:
+            confident_distance (float): Match distance under which an
+                identity is trusted until the next re-verification
+            iou_threshold (float, optional): Overlap needed to continue a
+                track. Defaults to 0.3.
+            max_misses (int, optional): Detection passes a track survives
+                without its face. Defaults to 5.
+            reverify_seconds (float, optional): Defaults to 5.0.
+            retry_seconds (float, optional): Defaults to 0.5.
+            clock (callable, optional): Defaults to time.monotonic
+        """
+        self.confident_distance = confident_distance
+        self.iou_threshold = iou_threshold
+        self.max_misses = max_misses
+        self.reverify_seconds = reverify_seconds
+        self.retry_seconds = retry_seconds
+        self.clock = clock
+        self._tracks = []
+        self._next_id = 1
+        self._lock = threading.Lock()
+
+    def _match_boxes(self, bboxes):
+        """Greedy assignment of detections to tracks, highest IoU first
+
+        Returns:
+            {int: Track}: Track continued by each detection index
+        """
+        if not self._tracks or not bboxes:
+            return {}
+        ious = iou_matrix([track.bbox for track in self._tracks], bboxes)
+        assigned = {}
+        used_tracks = set()
+        for flat in np.argsort(ious, axis=None)[::-1]:
+            track_index, box_index = np.unravel_index(flat, ious.shape)
+            if ious[track_index, box_index] < self.iou_threshold:
+                break
+            if track_index in used_tracks or box_index in assigned:
+                continue
+            used_tracks.add(track_index)
+            assigned[box_index] = self._tracks[track_index]
+        return assigned
+
+    def _needs_recognition(self, track, now):
+        if track.requested_at is not None and now - track.requested_at < self.retry_seconds:
+            # Asked recently, the answer may still be on its way
+            return False
+        if track.name is None:
+            return True
+        if track.name == self.UNKNOWN or track.distance >= self.confident_distance:
+            return now - track.verified_at >= self.retry_seconds
+        return now - track.verified_at >= self.reverify_seconds
+
+    def update(self, bboxes):
+        """Advance the tracks with the faces of a new detection pass
+
+        Args:
+            bboxes ([(int, int, int, int),]): Detected face boxes
+
+        Returns:
+            ([Track,], [int,]): Tracks to recognize and the index of the box
+            each one matched
+        """
+        now = self.clock()
+        with self._lock:
+            assigned = self._match_boxes(bboxes)
+            continued = set(id(track) for track in assigned.values())
+            for track in self._tracks:
+                if id(track) not in continued:
+                    track.misses += 1
+            self._tracks = [track for track in self._tracks if track.misses <= self.max_misses]
+            for box_index, bbox in enumerate(bboxes):
+                track = assigned.get(box_index)
+                if track is None:
+                    track = Track(self._next_id, bbox)
+                    self._next_id += 1
+                    self._tracks.append(track)
+                    assigned[box_index] = track
+                track.bbox = bbox
+                track.misses = 0
+            pending = []
+            for box_index in sorted(assigned):
+                track = assigned[box_index]
+                if self._needs_recognition(track, now):
+                    track.requested_at = now
+                    pending.append((track, box_index))
+        return [track for track, _ in pending], [box_index for _, box_index in pending]
+
+    def assign(self, tracks, matches):
+        """Store the recognition result of each track
+
+        Args:
+            tracks ([Track,]): Tracks returned by update()
+            matches ([FaceMatch,]): Match of each track's face
+        """
+        now = self.clock()
+        with self._lock:
+            for track, match in zip(tracks, matches):
+                track.name = match.name
+                track.distance = match.distance
+                track.verified_at = now
+                track.requested_at = None
+
+    def names(self):
+        """Returns:
+            [str,]: Identity of every live, recognized track, oldest first
+        """
+        with self._lock:
+            names = [track.name for track in self._tracks]
+        return [
+            name for name in dict.fromkeys(names) if name not in (None, self.UNKNOWN)
+        ]
+
+    def __len__(self):
+        return len(self._tracks)
@@ -1,38 +1,102 @@
-import face_recognition
 import numpy as np
 import os
 import time
-import concurrent.futures
-import cv2
-import json
-from .fr_functions import logger
+import threading
+import hashlib
+from decouple import config
+from .fr_functions import logger, FACE_REC_MODEL_NAME
+from .known_faces import KnownFacesGallery
+from .embedding_store import EmbeddingStore
+from .face_matcher import FaceMatcher, FaceMatch
+from .inference_worker import InferenceWorker
+from .backends import make_backend
+from .ann_index import IvfIndexBuilder
 
 
 class FacialRecognition:
 
     _FILE_DIR = os.path.dirname(os.path.abspath(__file__))
-    _JSON_PATH = _FILE_DIR + "/known_faces.json"
+    _JSON_PATH = _FILE_DIR + "/known_faces.json"  # Legacy, migrated to the store
+    _STORE_DIR = _FILE_DIR + "/known_faces_store"
     _FACE_PIC_DIR = _FILE_DIR + "/known_faces"
 
-    def __init__(self, picam2):
+    def __init__(self, picam2, store_dir=None, backend=None, json_path=None):
         """Class to handle all Facial Recognition logic
 
         Args:
             picam2 (Picam2): Picam2 object for image capture
-            facial_detect_model (degirum.Model): Facial detection model for Hailo 8l
-            facial_recog_model (degirum.Model): Facial recognition model for Hailo 8l
+            store_dir (Path, optional): Embedding store directory. Defaults
+                to known_faces_store next to this file.
+            backend (RecognitionBackend, optional): Models to run, built from
+                RECOGNITION_BACKEND when not given
+            json_path (Path, optional): Legacy known_faces.json imported into
+                a new store. Defaults to known_faces.json next to this file.
         """
         self.picam2 = picam2
+        self.backend = backend or make_backend(
+            config("RECOGNITION_BACKEND", default="hailo")
+        )
+        self.store = EmbeddingStore(store_dir or self._STORE_DIR)
+        self.store.migrate_from_json(json_path or self._JSON_PATH, model=FACE_REC_MODEL_NAME)
+        self.matcher = FaceMatcher(
+            threshold=self.backend.match_threshold,
+            metric=config("FACE_MATCH_METRIC", default="l2"),
+            aggregation=config("FACE_MATCH_AGGREGATION", default="best"),
+            top_k=config("FACE_MATCH_TOP_K", default=3, cast=int),
+        )
+        # Approximate search only pays off on large galleries, see ann_bench
+        self.index_builder = (
+            IvfIndexBuilder(
+                self.store.store_dir,
+                metric=self.matcher.metric,
+                n_lists=config("ANN_LISTS", default=0, cast=int) or None,
+                n_probe=config("ANN_PROBE", default=8, cast=int),
+                min_rows=config("ANN_MIN_ROWS", default=2500, cast=int),
+            )
+            if config("ANN_INDEX", default=True, cast=bool)
+            else None
+        )
+        self._workers = {}
+        self._workers_lock = threading.Lock()
 
-    def _safe_infer(self, model, *args, timeout=3):
-        with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
-            future = executor.submit(model, *args)
-            try:
-                return future.result(timeout=timeout)
-            except concurrent.futures.TimeoutError:
-                print("[Facial_Recognition] Timed Out")
-            except Exception as e:
-                print(f"[FacialRecognition] Inference Failed: {e}")
+    def _worker(self, role):
+        """Inference worker of the "detect" or "recognize" model, started on
+        its first call
+        """
+        worker = self._workers.get(role)
+        if worker is None:
+            with self._workers_lock:
+                worker = self._workers.get(role)
+                if worker is None:
+                    model = (
+                        self.backend.detect_model
+                        if role == "detect"
+                        else self.backend.recog_model
+                    )
+                    worker = InferenceWorker(
+                        model,
+                        name=role,
+                        max_queue=config("INFERENCE_QUEUE_SIZE", default=4, cast=int),
+                        timeout=config("INFERENCE_TIMEOUT", default=3.0, cast=float),
+                    )
+                    self._workers[role] = worker
+        return worker
+
+    def _safe_infer(self, role, *args, timeout=None):
+        return self._worker(role).infer(*args, timeout=timeout)
+
+    def inference_stats(self):
+        """Returns:
+            dict: InferenceWorker.stats() of the "detect" and "recognize"
+            models, the same for every backend
+        """
+        return {role: worker.stats() for role, worker in list(self._workers.items())}
+
+    def close(self):
+        """Stop the inference workers and the backend"""
+        for worker in list(self._workers.values()):
+            worker.close(timeout=1)
+        self.backend.close()
 
     # -- Capture an Save new face to json -- #
     def _capture_and_save(self, person_name, img_num, person_folder):
@@ -48,6 +112,7 @@ class FacialRecognition:
         write_success = self.picam2.capture_file(img_path)
         if write_success:
             logger.info(f"Image {img_num + 1} successfully saved to {person_name}")
+            return img_path
         else:
             logger.error(f"Error saving image {img_num + 1}")
 
@@ -57,6 +122,9 @@ class FacialRecognition:
         Args:
             person_name (str): Name of person to add to known_faces
             num_imgs (int, optional): Number of images to take. Defaults to 5.
+
+        Returns:
+            [Path,]: Paths of the images that were saved
         """
         new_person_folder = os.path.join(self._FACE_PIC_DIR, person_name)
 
@@ -66,6 +134,7 @@ class FacialRecognition:
         except OSError as e:
             logger.error(f"{new_person_folder} Failed to Create: {e}")
         print("Move your face for each picture..")
+        img_paths = []
         for x in range(num_imgs):
             print(f"Taking Picutre {x + 1} in...")
             print("3")
@@ -74,189 +143,223 @@ class FacialRecognition:
             time.sleep(1)
             print("1")
             time.sleep(1)
-            self._capture_and_save(
+            img_path = self._capture_and_save(
                 person_name=person_name, img_num=x, person_folder=new_person_folder
             )
+            if img_path:
+                img_paths.append(img_path)
+        return img_paths
 
     # -- Facial Recognition Process Functions-- #
-    def _cropped_faces(self, detected_faces):
+    def locate_faces(self, frame):
+        """Detect the faces of a frame
+
+        Returns:
+            ([(int, int, int, int),], [np.ndarray,]): Box of each face, and
+            its landmarks when the detector gives them (else None)
+        """
+        detected_faces = self._safe_infer("detect", frame)
+        if detected_faces is None:
+            return [], None
         try:
-            cropped_faces = []
-            for detected_face in detected_faces.results:
-                x1, y1, x2, y2 = map(int, detected_face["bbox"])
-                cropped_face = detected_faces.image[y1:y2, x1:x2]
-                cropped_face_scaled = cv2.resize(cropped_face, (112, 112))
-                cropped_faces.append(cropped_face_scaled)
-            return cropped_faces
+            bboxes = self.backend.bboxes(detected_faces)
         except Exception as e:
-            logger.error(f"Failed cropping faces: {e}")
-            return
-
-    def _encode_faces(self, cropped_faces, recog_model):
+            logger.error(f"Failed reading detected faces: {e}")
+            return [], None
         try:
-            face_encodings = []
-            for face in cropped_faces:
-                encoding = self._safe_infer(recog_model, face)
-                if encoding:
-                    encoding_array = np.array(encoding.results[0]['data'][0])
-                    face_encodings.append(encoding_array)
-            return face_encodings
+            landmarks = self.backend.landmarks(detected_faces)
         except Exception as e:
-            logger.error(f"Failed to encode faces: {e}")
-            return 
+            logger.error(f"Failed reading face landmarks: {e}")
+            landmarks = None
+        return bboxes, landmarks
 
-    def _convert_faces_to_names(self, face_encodings, known_encodings, known_names):
+    def prepare_faces(self, frame, bboxes, landmarks=None):
+        """Cut each face box out of a frame for the recognition model
 
-        def _euclidean_distance(encoding1, encoding2):
-            """Calculates the Euclidean distance between two encodings."""
-            return np.sqrt(np.sum((np.array(encoding1) - np.array(encoding2)) ** 2))
-        
-        try:
-            named_faces = []
-            for encoding in face_encodings:
-                distances = [
-                    _euclidean_distance(known_encoding, encoding) for known_encoding in known_encodings
-                    ]
-                best_dist_id = np.argmin(distances)
-                if distances[best_dist_id] < 6.0:
-                    named_faces.append(known_names[best_dist_id])
-                else:
-                    named_faces.append('unknown')
-            return named_faces
-        except Exception as e:
-            logger.error(f"Failed to convert faces to names: {e}")
-
-    def _convert_and_save_json(self, known_encodings, known_names): # Needs Error Correction
-        file_dir = os.path.dirname(os.path.abspath(__file__))
-        logger.info("Converting encodings to json")
-        json_encodings = []
-        for encoding in known_encodings:
-            json_encodings.append(list(encoding))
-        json_dict = {"known_encodings": json_encodings, "known_names": known_names}
-        json_file = os.path.join(file_dir, "known_faces.json")
-        with open(json_file, "w") as enc_file:
-            json.dump(json_dict, enc_file, indent=4)
-
-        logger.info("New entry saved.")
-    
-    def _get_json_file(self):
-        file_dir = os.path.dirname(os.path.abspath(__file__))
-        json_path = os.path.join(file_dir, "known_faces.json")
-        with open(json_path, "r") as json_data:
-            known_data = json.load(json_data)
-        known_encodings = [np.array(encoding) for encoding in known_data["known_encodings"]]
-        known_names = known_data["known_names"]
-        return known_encodings, known_names
+        Returns:
+            FaceBatch: Face inputs, which do not reference frame, and the
+            index of the box of each. Release it after recognition.
+        """
+        return self.backend.face_batch(frame, bboxes, landmarks)
 
-    # -- Facial Recognition End-Points -- #
-    def learn_new_faces_hailo(self, detect_model, recog_model):
-        """Train model to learn new faces using custom model on Hailo 8l
+    def _encode_faces(self, face_inputs):
+        """Encode every face of a frame in one batched inference call
+
+        Returns:
+            [np.ndarray,]: Encoding of each face, None where it failed
         """
-        known_encodings = []
-        known_names = []
-        logger.info("Creating known face encodings")
-        try:
-            os.makedirs(self._FILE_DIR, exist_ok=True)
-        except OSError as e:
-            logger.error(f"Failed to Create: {e}")
-            
-        if not os.listdir(self._FACE_PIC_DIR):
-            print("No faces saved, your first.")
-            name = input("What is your name: ")
-            self.capture_new_face(name)
-        try:
-            for person_name in os.listdir(self._FACE_PIC_DIR):
-                person_dir = os.path.join(self._FACE_PIC_DIR, person_name)
-                for filename in os.listdir(person_dir):
-                    if filename.endswith(".jpg"):
-                        img_path = os.path.join(person_dir, filename)
-                        try:
-                            detected_faces = self._safe_infer(detect_model, img_path)
-                            cropped_faces = self._cropped_faces(detected_faces)
-                            encoding_results = self._encode_faces(cropped_faces, recog_model)
-                            known_encodings.append(
-                                encoding_results[0]
-                            )  # Assuming only one face in learning image
-                            known_names.append(person_name)
-                        except Exception as e:
-                            logger.error(f"Failed to encode {person_name}, {img_path}: {e}")
-            self._convert_and_save_json(known_encodings, known_names)
-        except Exception as e:
-            print(f"{e}")
+        results = self._worker("recognize").infer_batch(face_inputs)
+        if results is None:
+            return [None] * len(face_inputs)
+        face_encodings = []
+        for result in results:
+            try:
+                face_encodings.append(self.backend.encoding(result))
+            except Exception as e:
+                logger.error(f"Failed to encode face: {e}")
+                face_encodings.append(None)
+        return face_encodings
 
-    def process_new_image_hailo(self, detect_model, recog_model):
-        """Perform Facial Detection and Recognition on new frame using
-        custom model on Hailo 8l
+    def match_faces(self, face_inputs, gallery=None):
+        """Encode faces and match them against the gallery
 
         Returns:
-            [str,]: List of names associated with faces from frame
+            [FaceMatch,]: Match of each face input, in order. Faces that
+            could not be encoded are unknown.
         """
-        known_encodings, known_names = self._get_json_file()
-        frame = self.picam2.capture_array()
-        try:
-            detected_faces = self._safe_infer(detect_model, frame)
-            cropped_faces = self._cropped_faces(detected_faces)
-            face_encodings = self._encode_faces(cropped_faces, recog_model)
-            named_faces = self._convert_faces_to_names(
-                face_encodings, known_encodings, known_names)
-            return named_faces
-        except Exception as e:
-            print(f"Failed to process new image: {e}")
+        gallery = gallery if gallery is not None else self._get_gallery()
+        face_encodings = self._encode_faces(face_inputs)
+        encoded = [index for index, encoding in enumerate(face_encodings) if encoding is not None]
+        matches = [FaceMatch(self.matcher.UNKNOWN, float("inf"), [])] * len(face_inputs)
+        for index, match in zip(
+            encoded, self.matcher.match([face_encodings[i] for i in encoded], gallery)
+        ):
+            matches[index] = match
+        return matches
+
+    def _hash_image(self, img_path):
+        """Content hash of an image file, used to spot changed images"""
+        with open(img_path, "rb") as img_file:
+            return hashlib.sha1(img_file.read()).hexdigest()
+
+    def _face_images(self):
+        """Returns:
+            [(str, Path),]: Person and path of every saved face image
+        """
+        images = []
+        for person_name in sorted(os.listdir(self._FACE_PIC_DIR)):
+            person_dir = os.path.join(self._FACE_PIC_DIR, person_name)
+            if not os.path.isdir(person_dir):
+                continue
+            for filename in sorted(os.listdir(person_dir)):
+                if filename.endswith(".jpg"):
+                    images.append((person_name, os.path.join(person_dir, filename)))
+        return images
+
+    def _sync_known_faces(self, encode_images, model):
+        """Bring the embedding store in line with the images in known_faces,
+        encoding only images that are new or whose content changed
+
+        Rows of deleted or changed images are dropped. Rows migrated from the
+        legacy json have no image and are kept for people with no images on
+        disk. Only new images on a non-empty store of the same model means an
+        append, anything else a rewrite.
+
+        Args:
+            encode_images (callable): encode_images([img_path,]) returns the
+                encoding of each image, None where no face was encoded
+            model (str): Model encode_images uses
+        """
+        images = self._face_images()
+        image_hashes = {img_path: self._hash_image(img_path) for _, img_path in images}
+        people_on_disk = set(person_name for person_name, _ in images)
+        encodings, index, header = self.store.load()
+
+        kept_rows = []
+        encoded_paths = set()
+        if header is not None and header["model"] == model:
+            for row, entry in enumerate(index):
+                img_path = entry["path"]
+                if img_path is None:
+                    if entry["name"] not in people_on_disk:
+                        kept_rows.append(row)
+                elif (
+                    image_hashes.get(img_path) == entry["image_hash"]
+                    and img_path not in encoded_paths
+                ):
+                    kept_rows.append(row)
+                    encoded_paths.add(img_path)
+
+        new_images = [image for image in images if image[1] not in encoded_paths]
+        new_encodings = encode_images([img_path for _, img_path in new_images]) if new_images else []
+        added = [
+            (person_name, img_path, encoding)
+            for (person_name, img_path), encoding in zip(new_images, new_encodings)
+            if encoding is not None
+        ]
+        dropped = (header["count"] if header else 0) - len(kept_rows)
+        logger.info(
+            f"Enrollment: {len(kept_rows)} kept, {len(added)} encoded, {dropped} dropped"
+        )
 
+        if added:
+            added_matrix = np.asarray([encoding for _, _, encoding in added], dtype=np.float32)
+        added_names = [person_name for person_name, _, _ in added]
+        added_hashes = [image_hashes[img_path] for _, img_path, _ in added]
+        added_paths = [img_path for _, img_path, _ in added]
+        if (
+            header is None
+            or dropped
+            or header["model"] != model
+            or header["count"] == 0
+        ):
+            if kept_rows and added:
+                matrix = np.concatenate([encodings[kept_rows], added_matrix])
+            elif kept_rows:
+                matrix = encodings[kept_rows]
+            elif added:
+                matrix = added_matrix
+            else:
+                matrix = np.zeros((0, 0), dtype=np.float32)
+            self.store.rewrite(
+                matrix,
+                [index[row]["name"] for row in kept_rows] + added_names,
+                [index[row]["image_hash"] for row in kept_rows] + added_hashes,
+                [index[row]["path"] for row in kept_rows] + added_paths,
+                model,
+            )
+        elif added:
+            self.store.append(added_matrix, added_names, added_hashes, added_paths, model)
 
-    # -- Functions for Non-Hailo Based Facial Recognition -- #
-    def learn_new_faces_cpu(self):
-        """Train model to learn new faces using FaceRecognition module on CPU
+    def _encode_images(self, img_paths):
+        """Encode the single face of each enrollment image, through the
+        backend's own enrollment path when it has one
         """
-        known_encodings = []
-        known_names = []
-        logger.info("Creating known face encodings")
+        if self.backend.encode_images is not None:
+            return self.backend.encode_images(img_paths)
+        encodings = []
+        for img_path in img_paths:
+            try:
+                image = self.backend.load_image(img_path)
+                bboxes, landmarks = self.locate_faces(image)
+                # Assuming only one face in learning image, aligned like the
+                # faces it will be matched with
+                batch = self.prepare_faces(image, bboxes[:1], landmarks[:1] if landmarks else None)
+                try:
+                    encoding_results = self._encode_faces(batch.faces)
+                finally:
+                    batch.release()
+                encodings.append(encoding_results[0] if encoding_results else None)
+            except Exception as e:
+                logger.error(f"Failed to encode {img_path}: {e}")
+                encodings.append(None)
+        return encodings
 
-        if not os.listdir(self._FACE_PIC_DIR):
+    def _first_face_capture(self):
+        if not self._face_images():
             print("No faces saved, your first.")
             name = input("What is your name: ")
             self.capture_new_face(name)
 
-        for person_name in os.listdir(self._FACE_PIC_DIR):
-            person_dir = os.path.join(self._FACE_PIC_DIR, person_name)
-            for filename in os.listdir(person_dir):
-                if filename.endswith(".jpg"):
-                    img_path = os.path.join(person_dir, filename)
-                    try:
-                        image = face_recognition.load_image_file(img_path)
-                        encodings = face_recognition.face_encodings(image)
-                        if encodings:
-                            known_encodings.append(
-                                encodings[0]
-                            )  # Assuming only one face in learning image
-                            known_names.append(person_name)
-                    except Exception as e:
-                        logger.error(f"Failed to encode {person_name}, {img_path}: {e}")
-
-        self._convert_and_save_json(known_encodings, known_names)
-
-    def process_new_image_cpu(self):
-        """Perform Facial Detection and Recognition on new frame using
-        FaceRecognition model on CPU
+    def _get_gallery(self):
+        return KnownFacesGallery(self.store, index_builder=self.index_builder).get()
 
-        Returns:
-            [str,]: List of names associated with faces from frame
+    # -- Facial Recognition End-Points -- #
+    def learn_new_faces(self):
+        """Train the backend's model to learn new faces. Only new or changed
+        images are encoded.
         """
-        known_encodings, known_names = self._get_json_file()
-        frame = self.picam2.capture_array()
-        face_encoding = face_recognition.face_encodings(frame)
-        face_names = []
-        for face in face_encoding:
-            matches = face_recognition.compare_faces(
-                known_encodings, face, tolerance=0.6
-            )
-            name = "unknown"
-            face_distances = face_recognition.face_distance(known_encodings, face)
-            best_dist_id = np.argmin(face_distances)
-            if matches[best_dist_id]:
-                name = known_names[best_dist_id]
-            face_names.append(name)
-        return face_names
+        logger.info("Updating known face encodings")
+        try:
+            os.makedirs(self._FACE_PIC_DIR, exist_ok=True)
+        except OSError as e:
+            logger.error(f"Failed to Create: {e}")
+
+        self._first_face_capture()
+        try:
+            self._sync_known_faces(self._encode_images, self.backend.model_name)
+        except Exception as e:
+            print(f"{e}")
 
 if __name__ == "__main__":
     None
@@ -1,8 +1,6 @@
 import logging
-import degirum as dg
 from decouple import config
 import numpy as np
-from picamera2 import Picamera2
 import time
 import os
 
@@ -31,10 +29,19 @@ logger.addHandler(console_handler)
 
 # --- End Logging Setup ---
 
+FACE_DET_MODEL_NAME = "scrfd_2.5g--640x640_quant_hailort_hailo8l_1"
+FACE_REC_MODEL_NAME = "arcface_mobilefacenet--112x112_quant_hailort_hailo8l_1"
+# Model behind face_recognition.face_encodings
+CPU_FACE_REC_MODEL_NAME = "dlib_face_recognition_resnet_model_v1"
+
 
 def _setup_model(type: str):
-    face_det_model_name = "scrfd_2.5g--640x640_quant_hailort_hailo8l_1"
-    face_rec_model_name = "arcface_mobilefacenet--112x112_quant_hailort_hailo8l_1"
+    # Imported here so the package can be used without the DeGirum runtime,
+    # e.g. with injected stand-in models in the benchmarks
+    import degirum as dg
+
+    face_det_model_name = FACE_DET_MODEL_NAME
+    face_rec_model_name = FACE_REC_MODEL_NAME
     inference_host_addr = "@local"
     zoo_url = "degirum/models_hailort"
     token = config("DEGIRUM_API_KEY")
@@ -58,7 +65,7 @@ def _setup_model(type: str):
         return face_rec_model
 
 
-def initialize_models():
+def initialize_detect_model():
     print("Initializing Detection Model")
     dummy_frame_detect = np.zeros((640, 640, 3), dtype=np.uint8)
     facial_detect_model = _setup_model("detect")
@@ -67,7 +74,10 @@ def initialize_models():
         logger.info("Face Detection Model Initialized")
     except Exception as e:
         logger.warning(f"Face Detection model failure: {e}")
+    return facial_detect_model
+
 
+def initialize_recog_model():
     print("Initializing Recognition Model")
     dummy_face_recog = np.zeros((112, 112, 3), dtype=np.uint8)
     facial_recog_model = _setup_model("recog")
@@ -76,10 +86,16 @@ def initialize_models():
         logger.info("Face Recognition Model Initialized")
     except Exception as e:
         logger.warning(f"Face Recognition model failure: {e}")
-    return facial_detect_model, facial_recog_model
+    return facial_recog_model
+
+
+def initialize_models():
+    return initialize_detect_model(), initialize_recog_model()
+
 
+def picam2_init(width: int = 640, height: int = 640):
+    from picamera2 import Picamera2
 
-def picam2_init(width: int = 640, height: int = 640) -> Picamera2:
     picam2 = Picamera2()
     cap_config = picam2.create_still_configuration(main={"size": (width, height)})
     picam2.configure(cap_config)
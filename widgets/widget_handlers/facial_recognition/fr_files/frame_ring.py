@@ -0,0 +1,92 @@
+import threading
+
+
+class FrameRing:
+
+    def __init__(self, slots=3):
+        """Small ring of reusable frame arrays shared by the capture thread
+        and the stages reading from it. Readers always get the newest frame;
+        frames nobody read in time are overwritten.
+
+        Three slots let one frame be written while another is held by a
+        reader and a third waits as the latest.
+
+        Args:
+            slots (int, optional): Number of frame arrays. Defaults to 3.
+        """
+        self._frames = [None] * slots
+        self._seqs = [0] * slots
+        self._holds = [0] * slots
+        self._latest = None
+        self._writing = None
+        self._last_seq = 0
+        self._cond = threading.Condition()
+
+    def _free_slot(self):
+        """Oldest slot that is neither the latest nor held by a reader"""
+        free = [
+            slot
+            for slot in range(len(self._frames))
+            if slot != self._latest and self._holds[slot] == 0
+        ]
+        if not free:
+            return None
+        return min(free, key=lambda slot: self._seqs[slot])
+
+    def write(self, fill_func):
+        """Fill a free slot and publish it as the latest frame
+
+        Args:
+            fill_func (callable): fill_func(out) writes a frame into out (None
+                until the slot first gets an array) and returns it, or None
+                when there is no frame
+
+        Returns:
+            int: Sequence number of the published frame, None if nothing was
+            published
+        """
+        with self._cond:
+            slot = self._free_slot()
+            if slot is None:
+                return None
+            self._writing = slot
+        # Filled outside the lock, readers only ever touch published slots
+        frame = fill_func(self._frames[slot])
+        with self._cond:
+            self._writing = None
+            if frame is None:
+                return None
+            self._frames[slot] = frame
+            self._last_seq += 1
+            self._seqs[slot] = self._last_seq
+            self._latest = slot
+            self._cond.notify_all()
+            return self._last_seq
+
+    def read_latest(self, after_seq=0, timeout=None):
+        """Wait for a frame newer than after_seq and hold it. The frame is
+        not copied, so it must be released once the reader is done with it.
+
+        Returns:
+            (int, np.ndarray, int): Sequence number, frame and slot to
+            release, None on timeout
+        """
+        with self._cond:
+            ready = self._cond.wait_for(
+                lambda: self._latest is not None
+                and self._seqs[self._latest] > after_seq,
+                timeout=timeout,
+            )
+            if not ready:
+                return None
+            slot = self._latest
+            self._holds[slot] += 1
+            return self._seqs[slot], self._frames[slot], slot
+
+    def release(self, slot):
+        with self._cond:
+            self._holds[slot] -= 1
+
+    @property
+    def last_seq(self):
+        return self._last_seq
@@ -0,0 +1,151 @@
+import os
+import numpy as np
+import cv2
+from .fr_functions import logger
+
+
+def _into(out, frame):
+    """Copy frame into the preallocated out when the shapes match, so the
+    ring buffer keeps reusing its slots
+    """
+    if out is not None and out.shape == frame.shape and out.dtype == frame.dtype:
+        np.copyto(out, frame)
+        return out
+    return frame
+
+
+class Picamera2Source:
+
+    def __init__(self, picam2):
+        """Frames from a Picamera2, or anything with capture_array()"""
+        self.picam2 = picam2
+
+    def read(self, out=None):
+        """Capture the next frame
+
+        capture_array already copies the frame out of the camera buffer, so
+        that array goes into the ring as is rather than being copied again.
+
+        Args:
+            out (np.ndarray, optional): Unused, the ring slot's old array
+
+        Returns:
+            np.ndarray: The captured frame, None if no frame could be read
+        """
+        return self.picam2.capture_array()
+
+    def close(self):
+        None
+
+
+class VideoFileSource:
+
+    def __init__(self, path, loop=True):
+        """Frames from a video file, decoded straight into the ring slot
+
+        Args:
+            path (Path): Video file
+            loop (bool, optional): Start over at the end. Defaults to True.
+        """
+        self.path = path
+        self.loop = loop
+        self._capture = cv2.VideoCapture(path)
+        if not self._capture.isOpened():
+            raise ValueError(f"Could not open video {path}")
+
+    def read(self, out=None):
+        ok, frame = self._capture.read(out)
+        if not ok and self.loop:
+            self._capture.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ok, frame = self._capture.read(out)
+        return frame if ok else None
+
+    def close(self):
+        self._capture.release()
+
+
+class ImageDirSource:
+    _EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+
+    def __init__(self, image_dir, loop=True):
+        """Frames from the images of a directory, in name order
+
+        Args:
+            image_dir (Path): Directory of images
+            loop (bool, optional): Start over after the last image.
+                Defaults to True.
+        """
+        self.paths = sorted(
+            os.path.join(image_dir, filename)
+            for filename in os.listdir(image_dir)
+            if filename.lower().endswith(self._EXTENSIONS)
+        )
+        if not self.paths:
+            raise ValueError(f"No images in {image_dir}")
+        self.loop = loop
+        self._next = 0
+
+    def read(self, out=None):
+        if self._next >= len(self.paths):
+            if not self.loop:
+                return None
+            self._next = 0
+        path = self.paths[self._next]
+        self._next += 1
+        frame = cv2.imread(path)
+        if frame is None:
+            logger.error(f"Could not read image {path}")
+            return None
+        return _into(out, frame)
+
+    def close(self):
+        None
+
+
+class SyntheticSource:
+
+    def __init__(self, size=(640, 640), draw_func=None):
+        """Generated frames, for running the pipeline without any input
+
+        Args:
+            size ((int, int), optional): Frame width and height
+            draw_func (callable, optional): draw_func(frame) paints into a
+                zeroed frame. Defaults to a blank frame.
+        """
+        self.size = size
+        self.draw_func = draw_func
+
+    def read(self, out=None):
+        width, height = self.size
+        if out is None or out.shape != (height, width, 3):
+            out = np.zeros((height, width, 3), dtype=np.uint8)
+        else:
+            out.fill(0)
+        if self.draw_func:
+            self.draw_func(out)
+        return out
+
+    def close(self):
+        None
+
+
+def make_frame_source(spec, picam2=None):
+    """Build the frame source named by a FRAME_SOURCE setting
+
+    Args:
+        spec (str): "picamera2", "video:<path>", "images:<dir>" or "synthetic"
+        picam2 (Picamera2, optional): Camera used by "picamera2"
+
+    Returns:
+        Frame source with read(out=None) and close()
+    """
+    kind, _, arg = spec.partition(":")
+    if kind == "picamera2":
+        return Picamera2Source(picam2)
+    if kind == "video":
+        return VideoFileSource(arg)
+    if kind == "images":
+        return ImageDirSource(arg)
+    if kind == "synthetic":
+        return SyntheticSource()
+    raise ValueError(f"Unknown frame source {spec}")
@@ -0,0 +1,169 @@
+import concurrent.futures
+import queue
+import threading
+import time
+from collections import deque
+from .fr_functions import logger
+
+
+class InferenceWorker:
+    _LATENCY_WINDOW = 256
+
+    def __init__(self, model, name="model", max_queue=4, timeout=3):
+        """Long-lived thread that runs every call of one model
+
+        Calls are queued on a bounded queue and run one at a time, so a model
+        is never entered from two threads. A full queue rejects new calls
+        straight away instead of letting them pile up behind a stuck model.
+
+        Args:
+            model (callable): Model to run, e.g. a degirum.Model
+            name (str, optional): Name used in logs and stats
+            max_queue (int, optional): Calls allowed to wait. Defaults to 4.
+            timeout (float, optional): Default seconds infer() waits for a
+                result. Defaults to 3.
+        """
+        self.model = model
+        self.name = name
+        self.timeout = timeout
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._latencies = deque(maxlen=self._LATENCY_WINDOW)
+        self._counters = {"completed": 0, "failed": 0, "timed_out": 0, "rejected": 0}
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name=f"infer-{name}", daemon=True
+        )
+        self._thread.start()
+
+    def _count(self, counter):
+        with self._lock:
+            self._counters[counter] += 1
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            try:
+                future, func, args = self._queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            # Skips calls whose caller already gave up while they were queued
+            if future.set_running_or_notify_cancel():
+                with self._lock:
+                    self._in_flight += 1
+                start = time.perf_counter()
+                try:
+                    result = func(*args)
+                except Exception as e:
+                    future.set_exception(e)
+                    self._count("failed")
+                else:
+                    future.set_result(result)
+                    self._count("completed")
+                with self._lock:
+                    self._in_flight -= 1
+                    self._latencies.append(time.perf_counter() - start)
+            self._queue.task_done()
+
+    def _predict_batch(self, items):
+        """Uses the model's own batch interface when it has one (degirum's
+        predict_batch pipelines the inputs through the accelerator), falls
+        back to one call per item otherwise.
+        """
+        predict_batch = getattr(self.model, "predict_batch", None)
+        if predict_batch is not None:
+            return list(predict_batch(items))
+        return [self.model(item) for item in items]
+
+    def _put(self, func, args):
+        future = concurrent.futures.Future()
+        try:
+            self._queue.put_nowait((future, func, args))
+        except queue.Full:
+            self._count("rejected")
+            raise
+        return future
+
+    def submit(self, *args):
+        """Queue a call without waiting for it
+
+        Returns:
+            concurrent.futures.Future: Result of model(*args)
+
+        Raises:
+            queue.Full: The queue is full, the model is falling behind
+        """
+        return self._put(self.model, args)
+
+    def submit_batch(self, items):
+        """Queue one batch of inputs as a single call
+
+        Returns:
+            concurrent.futures.Future: List with the result of each item
+
+        Raises:
+            queue.Full: The queue is full, the model is falling behind
+        """
+        return self._put(self._predict_batch, (list(items),))
+
+    def infer(self, *args, timeout=None):
+        """Run the model and wait for the result
+
+        A call that times out while still queued is cancelled. One that is
+        already running cannot be interrupted, its result is dropped.
+
+        Returns:
+            Model result, None if the call was rejected, timed out or failed
+        """
+        return self._wait(self.submit, args, timeout)
+
+    def infer_batch(self, items, timeout=None):
+        """Run the model over a batch of inputs and wait for all results
+
+        Returns:
+            list: Result of each item in order, None if the batch was
+            rejected, timed out or failed
+        """
+        if len(items) == 0:
+            return []
+        return self._wait(self.submit_batch, (items,), timeout)
+
+    def _wait(self, submit, args, timeout):
+        timeout = self.timeout if timeout is None else timeout
+        try:
+            future = submit(*args)
+        except queue.Full:
+            logger.error(f"[{self.name}] Inference queue full, call dropped")
+            return None
+        try:
+            return future.result(timeout=timeout)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            self._count("timed_out")
+            logger.error(f"[{self.name}] Inference timed out after {timeout}s")
+        except Exception as e:
+            logger.error(f"[{self.name}] Inference failed: {e}")
+        return None
+
+    def stats(self):
+        """Returns:
+            dict: Queue depth, in-flight calls, counters and p50/p95 latency
+            in seconds over the recent calls
+        """
+        with self._lock:
+            latencies = sorted(self._latencies)
+            stats = dict(self._counters)
+            stats["in_flight"] = self._in_flight
+        stats["queue_depth"] = self._queue.qsize()
+        for quantile in (0.5, 0.95):
+            key = f"latency_p{int(quantile * 100)}"
+            if latencies:
+                stats[key] = latencies[min(int(quantile * len(latencies)), len(latencies) - 1)]
+            else:
+                stats[key] = 0.0
+        return stats
+
+    def close(self, timeout=None):
+        """Stop the worker thread once the running call, if any, finishes"""
+        self._stop_event.set()
+        self._thread.join(timeout)
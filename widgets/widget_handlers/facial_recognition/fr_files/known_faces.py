@@ -0,0 +1,97 @@
+import threading
+import numpy as np
+from .fr_functions import logger
+
+
+class Gallery:
+
+    def __init__(self, encodings, names, version, index=None):
+        """Immutable snapshot of the known faces
+
+        Args:
+            encodings (np.ndarray): (n, dim) contiguous float32 matrix
+            names ((str,)): Name of each row of encodings
+            version (tuple): Identifies the store contents it was loaded from
+            index (IvfIndex, optional): Approximate index over encodings
+        """
+        self.encodings = encodings
+        self.names = names
+        self.version = version
+        self.index = index
+
+    def __len__(self):
+        return len(self.names)
+
+
+_EMPTY_GALLERY = Gallery(np.zeros((0, 0), dtype=np.float32), (), None)
+
+
+class KnownFacesGallery:
+
+    def __init__(self, store, index_builder=None):
+        """Keeps the known faces in memory and reloads them only when the
+        store on disk changes
+
+        Args:
+            store (EmbeddingStore): Store the gallery is loaded from
+            index_builder (IvfIndexBuilder, optional): Gives each loaded
+                gallery an approximate index
+        """
+        self.store = store
+        self.index_builder = index_builder
+        self._gallery = _EMPTY_GALLERY
+        self._reload_lock = threading.Lock()
+
+    def _store_version(self):
+        return self.store.version()
+
+    def _load(self, version):
+        encodings, index, header = self.store.load()
+        if encodings is None:
+            return Gallery(_EMPTY_GALLERY.encodings, (), version)
+        # Copy out of the memory map so the gallery outlives a store rewrite
+        encodings = np.array(encodings, dtype=np.float32, order="C")
+        ann_index = self.index_builder(encodings, header) if self.index_builder else None
+        return Gallery(
+            encodings, tuple(entry["name"] for entry in index), version, index=ann_index
+        )
+
+    def get(self):
+        """Returns the current gallery, reloading it first if the store
+        changed since the last load. Readers always get a complete snapshot.
+
+        Returns:
+            Gallery: Known encodings and names
+        """
+        version = self._store_version()
+        if version == self._gallery.version:
+            return self._gallery
+        return self.reload(version)
+
+    def reload(self, version=None, force=False):
+        """Load the store from disk and swap it in
+
+        Args:
+            version (tuple, optional): Store version already read by get()
+            force (bool, optional): Load even if the version looks unchanged,
+                used after enrollment. Defaults to False.
+
+        Returns:
+            Gallery: The newly loaded gallery
+        """
+        with self._reload_lock:
+            version = version or self._store_version()
+            if version is None:
+                self._gallery = _EMPTY_GALLERY
+                return self._gallery
+            if version == self._gallery.version and not force:
+                return self._gallery
+            try:
+                gallery = self._load(version)
+            except (OSError, ValueError, KeyError) as e:
+                logger.error(f"Failed to load known faces: {e}")
+                return self._gallery
+            # Single reference assignment, readers see the old or new gallery
+            self._gallery = gallery
+            logger.info(f"Loaded {len(gallery)} known face encodings")
+            return gallery
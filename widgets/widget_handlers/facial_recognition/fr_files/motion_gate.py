@@ -0,0 +1,96 @@
+import threading
+import time
+import numpy as np
+import cv2
+
+
+class MotionGate:
+
+    def __init__(
+        self,
+        size=(80, 60),
+        pixel_threshold=25,
+        changed_fraction=0.01,
+        recheck_seconds=2.0,
+        learning_rate=0.05,
+        clock=time.monotonic,
+    ):
+        """Cheap check run before face detection that lets a frame through
+        only when the scene changed, or when the last detection is older
+        than recheck_seconds so a person standing still is still seen.
+
+        Frames are shrunk to a small grayscale image and compared with a
+        running-average background.
+
+        Args:
+            size ((int, int), optional): Width and height frames are shrunk
+                to. Defaults to (80, 60).
+            pixel_threshold (int, optional): Gray level change that counts a
+                pixel as changed. Defaults to 25.
+            changed_fraction (float, optional): Share of changed pixels that
+                counts as motion. Defaults to 0.01.
+            recheck_seconds (float, optional): Longest time between
+                detections on a still scene. Defaults to 2.0.
+            learning_rate (float, optional): How fast the background follows
+                the scene. Defaults to 0.05.
+            clock (callable, optional): Defaults to time.monotonic
+        """
+        self.size = size
+        self.pixel_threshold = pixel_threshold
+        self.changed_fraction = changed_fraction
+        self.recheck_seconds = recheck_seconds
+        self.learning_rate = learning_rate
+        self.clock = clock
+        width, height = size
+        self._small = np.empty((height, width, 3), dtype=np.uint8)
+        self._gray = np.empty((height, width), dtype=np.uint8)
+        self._gray_f = np.empty((height, width), dtype=np.float32)
+        self._diff = np.empty((height, width), dtype=np.float32)
+        self._background = None
+        self._last_pass = None
+        self._counters = {"checked": 0, "passed": 0, "skipped": 0}
+        self._lock = threading.Lock()
+
+    def _to_gray(self, frame):
+        cv2.resize(frame, self.size, dst=self._small, interpolation=cv2.INTER_AREA)
+        cv2.cvtColor(self._small, cv2.COLOR_BGR2GRAY, dst=self._gray)
+        return self._gray
+
+    def _changed(self, gray):
+        if self._background is None:
+            self._background = gray.astype(np.float32)
+            return True
+        np.copyto(self._gray_f, gray)
+        cv2.absdiff(self._gray_f, self._background, dst=self._diff)
+        cv2.accumulateWeighted(gray, self._background, self.learning_rate)
+        changed = np.count_nonzero(self._diff > self.pixel_threshold)
+        return changed > self.changed_fraction * self._diff.size
+
+    def should_detect(self, frame):
+        """Check a frame and update the background
+
+        Args:
+            frame (np.ndarray): (h, w, 3) camera frame
+
+        Returns:
+            bool: True if detection should run on this frame
+        """
+        now = self.clock()
+        moved = self._changed(self._to_gray(frame))
+        due = self._last_pass is None or now - self._last_pass >= self.recheck_seconds
+        passed = moved or due
+        if passed:
+            self._last_pass = now
+        with self._lock:
+            self._counters["checked"] += 1
+            self._counters["passed" if passed else "skipped"] += 1
+        return passed
+
+    def stats(self):
+        """Returns:
+            dict: Frames checked, passed and skipped, and the share skipped
+        """
+        with self._lock:
+            stats = dict(self._counters)
+        stats["skip_ratio"] = stats["skipped"] / stats["checked"] if stats["checked"] else 0.0
+        return stats
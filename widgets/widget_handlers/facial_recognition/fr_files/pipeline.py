@@ -0,0 +1,199 @@
+import threading
+import time
+from .frame_ring import FrameRing
+from .fr_functions import logger
+
+
+class _Mailbox:
+
+    def __init__(self):
+        """Single-item handoff between two stages, a newer item replaces one
+        the next stage has not picked up yet
+        """
+        self._item = None
+        self._has_item = False
+        self._cond = threading.Condition()
+
+    def put(self, item):
+        """Returns:
+            (bool, object): Whether an unread item was replaced, and that item
+        """
+        with self._cond:
+            replaced = self._has_item
+            old_item = self._item
+            self._item = item
+            self._has_item = True
+            self._cond.notify()
+            return replaced, old_item
+
+    def get(self, timeout=None):
+        """Returns:
+            (bool, object): Whether an item arrived, and the item
+        """
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._has_item, timeout=timeout):
+                return False, None
+            item = self._item
+            self._item = None
+            self._has_item = False
+            return True, item
+
+
+class RecognitionPipeline:
+    _POLL_SECONDS = 0.5
+
+    def __init__(
+        self,
+        frame_source,
+        detect_func,
+        recognize_func,
+        publish_func,
+        stop_event,
+        setup_func=None,
+        slots=3,
+        capture_fps=30,
+        motion_gate=None,
+        discard_func=None,
+    ):
+        """Capture, detection and recognition each on their own thread
+
+        The capture thread fills a FrameRing. Detection takes the newest
+        frame without copying it, crops the faces and releases the frame, so
+        the next capture overlaps detection and detection of the next frame
+        overlaps recognition of this one. Each stage works on the newest
+        input and skips what it could not keep up with.
+
+        Args:
+            frame_source: Object with read(out=None), see frame_sources
+            detect_func (callable): detect_func(frame) -> detections, which
+                must not reference the frame
+            recognize_func (callable): recognize_func(detections) -> names,
+                detections is None when detection failed
+            publish_func (callable): publish_func(names) with each result
+            stop_event (threading.Event): Stops every stage when set
+            setup_func (callable, optional): Run on the capture thread
+                before the first capture, e.g. first-run enrollment
+            slots (int, optional): Frames in the ring. Defaults to 3.
+            capture_fps (float, optional): Capture rate cap, 0 for none.
+                Defaults to 30.
+            motion_gate (MotionGate, optional): Skips detection on frames
+                where nothing moved. The last result stays published.
+            discard_func (callable, optional): discard_func(detections) for
+                detections replaced before recognition picked them up, to
+                hand back their buffers
+        """
+        self.frame_source = frame_source
+        self.detect_func = detect_func
+        self.recognize_func = recognize_func
+        self.publish_func = publish_func
+        self.stop_event = stop_event
+        self.setup_func = setup_func
+        self.capture_fps = capture_fps
+        self.motion_gate = motion_gate
+        self.discard_func = discard_func
+        self.ring = FrameRing(slots)
+        self._detections = _Mailbox()
+        self._counters = {
+            "captured": 0,
+            "detected": 0,
+            "recognized": 0,
+            "skipped_frames": 0,
+            "skipped_detections": 0,
+        }
+        self._counters_lock = threading.Lock()
+        self._threads = []
+
+    def _count(self, counter, amount=1):
+        with self._counters_lock:
+            self._counters[counter] += amount
+
+    # -- Stages -- #
+    def _capture_loop(self):
+        if self.setup_func:
+            self.setup_func()
+        interval = 1 / self.capture_fps if self.capture_fps else 0
+        while not self.stop_event.is_set():
+            start = time.perf_counter()
+            try:
+                seq = self.ring.write(self.frame_source.read)
+            except Exception as e:
+                logger.error(f"Frame capture failed: {e}")
+                seq = None
+            if seq is not None:
+                self._count("captured")
+            wait = interval - (time.perf_counter() - start)
+            if seq is None:
+                wait = max(wait, 0.01)
+            if wait > 0:
+                self.stop_event.wait(wait)
+        self.frame_source.close()
+
+    def _detect_loop(self):
+        last_seq = 0
+        while not self.stop_event.is_set():
+            latest = self.ring.read_latest(last_seq, timeout=self._POLL_SECONDS)
+            if latest is None:
+                continue
+            seq, frame, slot = latest
+            if last_seq and seq > last_seq + 1:
+                self._count("skipped_frames", seq - last_seq - 1)
+            last_seq = seq
+            try:
+                if self.motion_gate and not self.motion_gate.should_detect(frame):
+                    continue
+                detections = self.detect_func(frame)
+            except Exception as e:
+                logger.error(f"Face detection failed: {e}")
+                detections = None
+            finally:
+                self.ring.release(slot)
+            self._count("detected")
+            replaced, dropped = self._detections.put(detections)
+            if replaced:
+                self._count("skipped_detections")
+                if self.discard_func:
+                    self.discard_func(dropped)
+
+    def _recognize_loop(self):
+        while not self.stop_event.is_set():
+            has_detections, detections = self._detections.get(timeout=self._POLL_SECONDS)
+            if not has_detections:
+                continue
+            try:
+                names = self.recognize_func(detections)
+            except Exception as e:
+                logger.error(f"Face recognition failed: {e}")
+                names = None
+            self._count("recognized")
+            self.publish_func(names)
+
+    # -- Control -- #
+    def start(self):
+        for name, target in (
+            ("fr-capture", self._capture_loop),
+            ("fr-detect", self._detect_loop),
+            ("fr-recognize", self._recognize_loop),
+        ):
+            thread = threading.Thread(target=target, name=name, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def is_alive(self):
+        return any(thread.is_alive() for thread in self._threads)
+
+    def join(self, timeout=None):
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def stats(self):
+        """Returns:
+            dict: Frames captured, detected and recognized, how many each
+            stage skipped to stay on the newest input, and the motion gate's
+            stats when there is one
+        """
+        with self._counters_lock:
+            stats = dict(self._counters)
+        if self.motion_gate:
+            stats["motion_gate"] = self.motion_gate.stats()
+        return stats
@@ -3,6 +3,7 @@ import requests
 import json
 import threading
 import datetime
+import time
 from decouple import config
 
 
@@ -12,28 +13,64 @@ class WeatherClient:
     _WEATHER_DIR = os.path.dirname(os.path.abspath(__file__))
     _FORECAST_JSON = os.path.join(_WEATHER_DIR, "forecast.json")
     _ICON_DIR = os.path.join(_WEATHER_DIR, 'weather_icons')
+    _REQUEST_TIMEOUT = 10
+    # Retry interval after a failed refresh, instead of the 16 minute schedule
+    _RETRY_SECONDS = 60
+    _STALE_SECONDS = config("WEATHER_STALE_MINUTES", default=60, cast=int) * 60
+
+    # Weather data states, see get_status
+    NO_DATA = "no_data"
+    STALE = "stale"
+    FRESH = "fresh"
 
     def __init__(self):
+        """Serves the last good forecast from memory or forecast.json right
+        away and refreshes it on a background thread. Never waits for the
+        network; until a forecast exists get_status reports NO_DATA.
+        """
         self.forecast_datalock = threading.Lock()
-        self.update_lock = threading.Lock()
-        self.forecast = self._load_weather_json()
-        self._is_updated = True
+        self._refresh_lock = threading.Lock()
+        self._refreshing = False
         self._last_update_clock = None
+        self._last_attempt = None
+        self.last_error = None
         self._degree_symbol = chr(0xB0)
+        self.on_update = None
+        # (forecast, current icon path, {condition code: icon path})
+        self._icon_paths = (None, None, {})
+        self.forecast, self._saved_at = self._load_weather_json()
+        if self.forecast is None or self._age() > self._STALE_SECONDS:
+            self._start_request_weather_thread(self._get_forecast_url)
 
     # -- Weather API calling and JSON updating -- #
-    def _ensure_weather_json_exists(self):
-        if not os.path.exists(self._FORECAST_JSON):
-            self._start_request_weather_thread(self._get_forecast_url)
+    def _load_weather_json(self):
+        """Last saved forecast
 
-    def _load_weather_json(self):  
-        self._ensure_weather_json_exists()
-        while not os.path.exists(self._FORECAST_JSON):
-            None
-        with self.forecast_datalock:
+        Returns:
+            (dict, float): Forecast and the time it was saved, (None, None)
+            if there is no usable file
+        """
+        try:
             with open(self._FORECAST_JSON) as json_file:
                 forecast = json.load(json_file)
-        return forecast
+            saved_at = os.path.getmtime(self._FORECAST_JSON)
+        except FileNotFoundError:
+            return None, None
+        except (OSError, ValueError) as e:
+            print(f"Failed to load saved weather data: {e}")
+            return None, None
+        if not self._is_forecast(forecast):
+            return None, None
+        return forecast, saved_at
+
+    @staticmethod
+    def _is_forecast(data):
+        """weatherapi.com answers errors with {"error": ...}, those are not
+        worth keeping
+        """
+        return isinstance(data, dict) and all(
+            key in data for key in ("location", "current", "forecast")
+        )
 
     def _get_forecast_url(self):
         _base_url_addon = "forecast.json"
@@ -44,30 +81,55 @@ class WeatherClient:
     def _request_weather(self, url_func):
         url, params = url_func()
         try:
-            r = requests.get(url, params=params)
+            r = requests.get(url, params=params, timeout=self._REQUEST_TIMEOUT)
             data = r.json()
             return data
         except Exception as e:
-            print(f'Error retreiving API response: {e}\n Attempting again in 30 minutes')
+            print(f'Error retreiving API response: {e}\n Attempting again in {self._RETRY_SECONDS} seconds')
 
     def _save_weather(self, data):
+        """Write forecast.json through a temp file and a rename, so a reader
+        never sees a half-written file
+        """
+        tmp_path = self._FORECAST_JSON + ".tmp"
         try:
-            with self.forecast_datalock:
-                    with open(self._FORECAST_JSON, "w") as json_file:
-                        json.dump(data, json_file, indent=4)
+            with open(tmp_path, "w") as json_file:
+                json.dump(data, json_file, indent=4)
+                json_file.flush()
+                os.fsync(json_file.fileno())
+            os.replace(tmp_path, self._FORECAST_JSON)
         except Exception as e:
-            print(f"Failed to save weather data: {e}\n Attempting again in 30 minutes")
+            print(f"Failed to save weather data: {e}")
 
     def _request_and_save_weather(self, url_func):
-        data = self._request_weather(url_func)
-        if data:
+        try:
+            data = self._request_weather(url_func)
+            if not self._is_forecast(data):
+                if data:
+                    print(f"Unexpected weather API response: {data.get('error', data)}")
+                with self.forecast_datalock:
+                    self.last_error = "request failed"
+                return
+            with self.forecast_datalock:
+                self.forecast = data
+                self._saved_at = time.time()
+                self.last_error = None
             self._save_weather(data)
-            with self.update_lock:
-                self._is_updated = False
-            
+        finally:
+            with self._refresh_lock:
+                self._refreshing = False
+        if self.on_update:
+            self.on_update()
+
     def _start_request_weather_thread(self, url_func):
+        """Refresh in the background unless a refresh is already running"""
+        with self._refresh_lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+            self._last_attempt = time.monotonic()
         weather_thread = threading.Thread(
-            target=self._request_and_save_weather, args=[url_func]
+            target=self._request_and_save_weather, args=[url_func], daemon=True
         )
         weather_thread.start()
 
@@ -75,15 +137,69 @@ class WeatherClient:
         # 31 minutes to allow for weather server to update at 30
         return current_min % 16 == 1 and current_min != self._last_update_clock
 
+    def _needs_retry(self):
+        return (
+            self.last_error is not None
+            and time.monotonic() - self._last_attempt >= self._RETRY_SECONDS
+        )
+
     def _check_for_temp_update(self):
-        if self._is_updated is False:
-            self.forecast = self._load_weather_json()
-            with self.update_lock:
-                self._is_updated = True
         current_min = int(datetime.datetime.now().strftime('%M'))
         if self._needs_weather_update(current_min):
             self._last_update_clock = current_min
             self._start_request_weather_thread(self._get_forecast_url)
+        elif self._needs_retry():
+            self._start_request_weather_thread(self._get_forecast_url)
+
+    def _age(self):
+        """Seconds since the forecast was fetched, inf without one"""
+        if self._saved_at is None:
+            return float("inf")
+        return max(time.time() - self._saved_at, 0)
+
+    def get_status(self):
+        """State of the weather data, for the widgets to show
+
+        Returns:
+            (str, str): NO_DATA, STALE or FRESH, and a line describing it,
+            None when FRESH
+        """
+        self._check_for_temp_update()
+        if self.forecast is None:
+            if self.last_error:
+                return self.NO_DATA, "Weather unavailable"
+            return self.NO_DATA, "Loading weather"
+        age = self._age()
+        if age <= self._STALE_SECONDS:
+            return self.FRESH, None
+        if age < 3600:
+            return self.STALE, f"Updated {int(age // 60)}m ago"
+        if age < 48 * 3600:
+            return self.STALE, f"Updated {int(age // 3600)}h ago"
+        return self.STALE, f"Updated {int(age // 86400)}d ago"
+
+    def _get_icon_paths(self, forecast):
+        """Icons of a forecast, looked up on disk once per forecast instead
+        of on every frame that draws them
+
+        Returns:
+            (Path, {int: Path}): Current conditions icon and the icon of
+            each forecast condition code
+        """
+        resolved_for, current_icon_path, forecast_icon_paths = self._icon_paths
+        if resolved_for is forecast:
+            return current_icon_path, forecast_icon_paths
+        current = forecast["current"]
+        current_icon_path = self._get_current_icon_path(
+            current["is_day"], current['condition']['code']
+        )
+        forecast_icon_paths = {}
+        for day in forecast['forecast']['forecastday']:
+            icon_code = day['day']['condition']['code']
+            if icon_code not in forecast_icon_paths:
+                forecast_icon_paths[icon_code] = self._get_forcast_icon(icon_code)
+        self._icon_paths = (forecast, current_icon_path, forecast_icon_paths)
+        return current_icon_path, forecast_icon_paths
 
     # -- Get data for current weather widget -- #
     def _get_location(self):
@@ -92,9 +208,7 @@ class WeatherClient:
         location_str = f"{location}, {region}"
         return location_str
 
-    def _get_current_icon_path(self):
-        is_day = self.forecast["current"]["is_day"]
-        code = self.forecast["current"]['condition']['code']
+    def _get_current_icon_path(self, is_day, code):
         icon_day_night_path = os.path.join(self._ICON_DIR, f'{is_day}/{code}.png')
         icon_path = os.path.join(self._ICON_DIR, f'{code}.png')
         cloudy_icon = os.path.join(self._ICON_DIR, '1009.png')
@@ -112,10 +226,14 @@ class WeatherClient:
 
     def _get_daily_temp_f(self):
         current_date = datetime.datetime.now().strftime('%Y-%m-%d')
-        for day in self.forecast['forecast']['forecastday']:
+        forecast_days = self.forecast['forecast']['forecastday']
+        # A stale forecast may not reach today, show its last day then
+        today = forecast_days[-1]
+        for day in forecast_days:
             if day['date'] == current_date:
-                day_high = int(day['day']['maxtemp_f'])
-                day_low = int(day['day']['mintemp_f'])
+                today = day
+        day_high = int(today['day']['maxtemp_f'])
+        day_low = int(today['day']['mintemp_f'])
         day_high_str = f"High {day_high}{self._degree_symbol}F"
         day_low_str = f"Low {day_low}{self._degree_symbol}F"
         return day_high_str, day_low_str
@@ -124,7 +242,7 @@ class WeatherClient:
         self._check_for_temp_update()
         location_str = self._get_location()
         current_temp_str = self._get_current_temp_f()
-        current_icon_path = self._get_current_icon_path()
+        current_icon_path = self._get_icon_paths(self.forecast)[0]
         daily_temp_strs = self._get_daily_temp_f()
 
         return location_str, current_temp_str, current_icon_path, daily_temp_strs
@@ -140,7 +258,12 @@ class WeatherClient:
         
     def get_forecast_5day(self):
         forecast_5day = []
-        for day in self.forecast['forecast']['forecastday'][1:]:
+        current_date = datetime.datetime.now().strftime('%Y-%m-%d')
+        forecast = self.forecast
+        forecast_icon_paths = self._get_icon_paths(forecast)[1]
+        for day in forecast['forecast']['forecastday']:
+            if day['date'] <= current_date:
+                continue
             day_dict = {}
             day_datetime = datetime.datetime.strptime(day['date'], "%Y-%m-%d")
             day_dict['weekday_str'] = day_datetime.strftime("%A")
@@ -152,7 +275,7 @@ class WeatherClient:
             low = int(day['day']['mintemp_f'])
             day_dict['low_str'] = f"{low}{self._degree_symbol}F"
             icon_code = day['day']['condition']['code']
-            day_dict['icon_path'] = self._get_forcast_icon(icon_code)
+            day_dict['icon_path'] = forecast_icon_paths[icon_code]
             forecast_5day.append(day_dict)
         return forecast_5day
             
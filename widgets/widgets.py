@@ -1,53 +1,189 @@
 import datetime
-from .widget_handlers import weather_client, facial_rec_handler
+from .widget_handlers import WeatherClient
 from .fonts import FontHandler
+from .animation import Animator, EASINGS
+from .static_layer import StaticLayer
+from .layout import LayoutEngine, WidgetLayout
+from .events import PRESENCE_CHANGED, WEATHER_UPDATED, post_wakeup
 from decouple import config
 import qrcode
-import os
+import pygame
+import io
 
 
 class Widgets:
     _MAX_ALPHA = 255
     _PARTIAL_ALPHA = 125
     _MARGIN_VALUE = 20
+    _CURRENT_ICON_SIZE = 80
+    _FORECAST_ICON_SIZE = 50
+    _QRCODE_ALPHA = 150
+    _QRCODE_SIZE = 80
+    # Screen corner or edge each widget group is pinned to
+    _ANCHORS = {
+        "greeting": config("GREETING_ANCHOR", default="midtop"),
+        "date_and_time": config("DATE_TIME_ANCHOR", default="topleft"),
+        "weather": config("WEATHER_ANCHOR", default="topright"),
+        "qrcode": config("QRCODE_ANCHOR", default="bottomright"),
+    }
+    # Widget alpha track: (alpha once nobody is in frame, fade time in seconds)
+    _FADES = {
+        "date": (0, 3),
+        "time": (_PARTIAL_ALPHA, 1.5),
+        "location": (0, 3),
+        "current_temp": (_PARTIAL_ALPHA, 1.5),
+        "current_icon": (_PARTIAL_ALPHA, 1.5),
+        "daily_temps": (0, 3),
+        "forecast": (0, 3),
+    }
 
-    def __init__(self, smart_mirror):
+    def __init__(self, smart_mirror, weather_client=None, facial_rec_handler=None):
         """Class to handle Widget interaction with pygame
 
+        The handlers can be attached later, when startup has built them.
+        Until then the widgets that need them are not drawn.
+
         Args:
             smart_mirror (SmartMirror): SmartMirror object
+            weather_client (WeatherClient, optional): Client for the weather
+                widgets
+            facial_rec_handler (FacialRecognitionHandler, optional): Handler
+                for the greeting and the fades
         """
         self.smart_mirror = smart_mirror
-        self.weather_client = weather_client
-        self.facial_rec_handler = facial_rec_handler
+        self.weather_client = None
+        self.facial_rec_handler = None
+        self.facial_rec_thread = None
         self.fonts = FontHandler(self.smart_mirror)
-        self.facial_rec_thread = self.facial_rec_handler.start_in_frame_thread()
-        self._alpha_full_value = self._MAX_ALPHA
-        self._alpha_partial_value = self._MAX_ALPHA
+        self.smart_mirror.preload_images(
+            WeatherClient._ICON_DIR,
+            sizes=(self._CURRENT_ICON_SIZE, self._FORECAST_ICON_SIZE),
+        )
+        if weather_client is not None:
+            self.attach_weather_client(weather_client)
+        if facial_rec_handler is not None:
+            self.attach_facial_rec_handler(facial_rec_handler)
+        self.animator = Animator()
+        self._fade_easing = EASINGS[config("FADE_EASING", default="linear")]
+        self.static_layer = StaticLayer()
+        self.layout = LayoutEngine(self.smart_mirror.screen_rect)
+        self._register_layouts()
+        # Called in order by create_and_place, timed under their names
+        self._widget_funcs = [
+            ("update_alpha_values", self._update_alpha_values),
+            ("static_layer", self._static_layer),
+            ("face_rec_name", self._face_rec_name),
+            ("date_and_time", self._date_and_time),
+            ("weather_and_location", self._weather_and_location),
+        ]
         self._to_draw = []
 
+    # -- Handlers -- #
+    def attach_weather_client(self, weather_client):
+        """Start drawing the weather widgets from weather_client"""
+        weather_client.on_update = lambda: post_wakeup(WEATHER_UPDATED)
+        self.weather_client = weather_client
+
+    def attach_facial_rec_handler(self, facial_rec_handler):
+        """Start the recognition pipeline and greet the faces it finds"""
+        facial_rec_handler.on_presence_change = lambda: post_wakeup(PRESENCE_CHANGED)
+        self.facial_rec_handler = facial_rec_handler
+        self.facial_rec_thread = facial_rec_handler.start_in_frame_thread()
+
+    # -- Widget placement -- #
+    def _register_layouts(self):
+        """Declare where each widget group sits. Items are placed relative to
+        each other and the group is pinned to its anchor on the screen.
+        """
+        margin = self._MARGIN_VALUE
+        self.layout.register("greeting", WidgetLayout(self._ANCHORS["greeting"]))
+        self.layout.register("weather_status", WidgetLayout(self._ANCHORS["weather"]))
+        self.layout.register("qrcode", WidgetLayout(self._ANCHORS["qrcode"]))
+        self.layout.register(
+            "date_and_time",
+            WidgetLayout(
+                self._ANCHORS["date_and_time"],
+                [
+                    ("time", "midtop", "date", "midbottom", 0),
+                    ("time", "top", "time", "top", margin),
+                ],
+            ),
+        )
+
+    def _weather_layout(self, forecast_days, stale=False):
+        """Registers the weather layout for a number of forecast rows, with
+        a line above the location saying how old stale data is
+
+        Returns:
+            str: Name of the layout
+        """
+        name = f"weather_{forecast_days}{'_stale' if stale else ''}"
+        if self.layout.is_registered(name):
+            return name
+        margin = self._MARGIN_VALUE
+        constraints = [
+            ("current_temp", "midtop", "location", "midbottom", 0),
+            ("current_temp", "top", "current_temp", "top", margin),
+            ("current_icon", "midright", "current_temp", "midleft", 0),
+            ("current_temp", "left", "current_temp", "left", margin),
+            ("daily_high", "topleft", "current_temp", "topright", 0),
+            ("daily_low", "bottomleft", "current_temp", "bottomright", 0),
+            ("daily_high", "right", "location", "right", 0),
+            ("daily_low", "right", "location", "right", 0),
+            ("daily_low", "top", "daily_low", "top", 5),
+        ]
+        if stale:
+            constraints.append(("stale", "bottomright", "location", "topright", 0))
+        for x in range(forecast_days):
+
+            def row_offset(rects, x=x):
+                full_height = rects[f"day{x}"].height + rects[f"date{x}"].height
+                return x * full_height + margin
+
+            constraints += [
+                (f"day{x}", "topleft", "location", "bottomleft", 0),
+                (f"day{x}", "top", "current_icon", "bottom", row_offset),
+                (f"date{x}", "topleft", f"day{x}", "bottomleft", 0),
+                (f"icon{x}", "center", f"date{x}", "topright", 0),
+                (f"high_temp{x}", "center", f"icon{x}", "center", 0),
+                (f"high_temp{x}", "right", "location", "right", -margin),
+                (f"icon{x}", "right", f"high_temp{x}", "left", -margin),
+            ]
+        self.layout.register(
+            name, WidgetLayout(self._ANCHORS["weather"], constraints)
+        )
+        return name
+
     # -- Fading algorithm -- #
-    def _update_alpha_values(self, time=3, framerate=30):
-        """Updates the alpha value for widget fade.
+    def _update_alpha_values(self):
+        """Points every widget's alpha track at its target. Widgets snap to
+        opaque when someone is in frame and fade to their resting alpha
+        over _FADES seconds once the frame is empty.
+        """
+        present = bool(self.facial_rec_handler and self.facial_rec_handler.in_frame)
+        for name, (rest_alpha, duration) in self._FADES.items():
+            track = self.animator.track(name, self._MAX_ALPHA)
+            if present:
+                track.set(self._MAX_ALPHA)
+            else:
+                track.animate_to(rest_alpha, duration, self._fade_easing)
 
-        Args:
-            time (int, optional): How long to go from opaque to transparent. Defaults to 3.
-            framerate (int, optional): Framerate of the application. Defaults to 30.
+    def _alpha(self, name):
+        return self.animator.track(name).alpha()
+
+    def is_animating(self):
+        """Checks if a widget fade is still running
+
+        Returns:
+            bool: True until every alpha track reaches its target
         """
-        zero_value_factor = self._MAX_ALPHA / (framerate * time)
-        partial_value_factor = self._PARTIAL_ALPHA / (framerate * (time / 2))
-        if self.facial_rec_handler.in_frame:
-            self._alpha_full_value = self._MAX_ALPHA
-            self._alpha_partial_value = self._MAX_ALPHA
-            return
-        if self._alpha_full_value > 0:
-            self._alpha_full_value -= zero_value_factor
-        if self._alpha_partial_value > self._PARTIAL_ALPHA:
-            self._alpha_partial_value -= partial_value_factor
+        return self.animator.is_animating()
 
     # -- Facial recognition widget -- #
     def _face_rec_name(self):
         """Current Recognized Face"""
+        if self.facial_rec_handler is None:
+            return None
         with self.facial_rec_handler.in_frame_datalock:
             in_frame_copy = self.facial_rec_handler.in_frame[:]
 
@@ -66,9 +202,8 @@ class Widgets:
         names = self.fonts.render_string(
             name_str, self.fonts.modern_sans_light["large"]
         )
-        names_rect = names.get_rect()
-        names_rect.midtop = self.smart_mirror.screen_rect.midtop
-        self._to_draw.append((names, names_rect))
+        rects = self.layout.place("greeting", {"names": names.get_size()})
+        self._to_draw.append((names, rects["names"], self._MAX_ALPHA))
 
     # -- Date and Time widget -- #
     def _date_and_time(self):
@@ -83,23 +218,27 @@ class Widgets:
             current_time_str, self.fonts.modern_sans_light["large"]
         )
 
-        current_date_rect = current_date.get_rect()
-        current_time_rect = current_time.get_rect()
-
-        # Set Alpha Values for partial or full fade.
-        current_date.set_alpha(self._alpha_full_value)
-        current_time.set_alpha(self._alpha_partial_value)
-
-        current_date_rect.topleft = self.smart_mirror.screen_rect.topleft
-        current_time_rect.midtop = current_date_rect.midbottom
-        current_time_rect.top += self._MARGIN_VALUE
+        rects = self.layout.place(
+            "date_and_time",
+            {"date": current_date.get_size(), "time": current_time.get_size()},
+        )
 
-        self._to_draw.append((current_date, current_date_rect))
-        self._to_draw.append((current_time, current_time_rect))
+        self._to_draw.append((current_date, rects["date"], self._alpha("date")))
+        self._to_draw.append((current_time, rects["time"], self._alpha("time")))
 
     # -- Weather and Locationwidget -- #
     def _weather_and_location(self):
         """Current Weather and Location"""
+        if self.weather_client is None:
+            return None
+        state, status_str = self.weather_client.get_status()
+        if state == self.weather_client.NO_DATA:
+            status = self.fonts.render_string(
+                status_str, self.fonts.raleway_light["small"]
+            )
+            rects = self.layout.place("weather_status", {"status": status.get_size()})
+            self._to_draw.append((status, rects["status"], self._alpha("current_temp")))
+            return None
 
         location_str, current_temp_str, current_icon_path, daily_temp_strs = (
             self.weather_client.get_current_location_weather()
@@ -113,7 +252,9 @@ class Widgets:
         current_temp = self.fonts.render_string(
             current_temp_str, self.fonts.raleway_light["large"]
         )
-        current_icon = self.smart_mirror.import_image(current_icon_path)
+        current_icon = self.smart_mirror.import_image(
+            current_icon_path, size=self._CURRENT_ICON_SIZE
+        )
         daily_high = self.fonts.render_string(
             daily_high_str, self.fonts.raleway_light["small"]
         )
@@ -121,113 +262,128 @@ class Widgets:
             daily_low_str, self.fonts.raleway_light["small"]
         )
 
-        location_rect = location.get_rect()
-        current_temp_rect = current_temp.get_rect()
-        current_icon_rect = current_icon.get_rect()
-        daily_high_rect = daily_high.get_rect()
-        daily_low_rect = daily_low.get_rect()
-
-        # Set Alpha Values for partial or full fade.
-        location.set_alpha(self._alpha_full_value)
-        current_temp.set_alpha(self._alpha_partial_value)
-        current_icon.set_alpha(self._alpha_partial_value)
-        daily_high.set_alpha(self._alpha_full_value)
-        daily_low.set_alpha(self._alpha_full_value)
-
-        # Place Rects on screen in relation to eachother
-        # (To make these moveable, separate lower alignment from screen
-        # make a dict that the key is the base starting location and map it to this fucntion)
-        location_rect.topright = self.smart_mirror.screen_rect.topright
-        current_temp_rect.midtop = location_rect.midbottom
-        current_temp_rect.top += self._MARGIN_VALUE
-        current_icon_rect.midright = current_temp_rect.midleft
-        current_temp_rect.left += self._MARGIN_VALUE
-        daily_high_rect.topleft = current_temp_rect.topright
-        daily_low_rect.bottomleft = current_temp_rect.bottomright
-        daily_high_rect.right = self.smart_mirror.screen_rect.right
-        daily_low_rect.right = self.smart_mirror.screen_rect.right
-        daily_low_rect.top += 5
-
-        for x in range(len(forecast_5day)):
+        forecast_rows = []
+        for day_forecast in forecast_5day:
             day = self.fonts.render_string(
-                forecast_5day[x]["weekday_str"], self.fonts.modern_sans_light["medium"]
+                day_forecast["weekday_str"], self.fonts.modern_sans_light["medium"]
             )
             date = self.fonts.render_string(
-                forecast_5day[x]["date_str"], self.fonts.modern_sans_light["small"]
+                day_forecast["date_str"], self.fonts.modern_sans_light["small"]
             )
             high_temp = self.fonts.render_string(
-                forecast_5day[x]["high_str"], self.fonts.raleway_light["medium"]
+                day_forecast["high_str"], self.fonts.raleway_light["medium"]
             )
             icon = self.smart_mirror.import_image(
-                forecast_5day[x]["icon_path"], size=50
+                day_forecast["icon_path"], size=self._FORECAST_ICON_SIZE
             )
+            forecast_rows.append((day, date, high_temp, icon))
 
-            day_rect = day.get_rect()
-            date_rect = date.get_rect()
-            high_temp_rect = high_temp.get_rect()
-            icon_rect = icon.get_rect()
-
-            day.set_alpha(self._alpha_full_value)
-            date.set_alpha(self._alpha_full_value)
-            high_temp.set_alpha(self._alpha_full_value)
-            icon.set_alpha(self._alpha_full_value)
-
-            full_height = day_rect.height + date_rect.height
-            day_rect.topleft = location_rect.bottomleft
-            day_rect.top = (
-                current_icon_rect.bottom + (x * full_height) + self._MARGIN_VALUE
+        sizes = {
+            "location": location.get_size(),
+            "current_temp": current_temp.get_size(),
+            "current_icon": current_icon.get_size(),
+            "daily_high": daily_high.get_size(),
+            "daily_low": daily_low.get_size(),
+        }
+        for x, (day, date, high_temp, icon) in enumerate(forecast_rows):
+            sizes[f"day{x}"] = day.get_size()
+            sizes[f"date{x}"] = date.get_size()
+            sizes[f"high_temp{x}"] = high_temp.get_size()
+            sizes[f"icon{x}"] = icon.get_size()
+        stale = state == self.weather_client.STALE
+        if stale:
+            stale_note = self.fonts.render_string(
+                status_str, self.fonts.raleway_light["small"]
             )
-            date_rect.topleft = day_rect.bottomleft
-            icon_rect.center = date_rect.topright
-            high_temp_rect.center = icon_rect.center
-            high_temp_rect.right = (
-                self.smart_mirror.screen_rect.right - self._MARGIN_VALUE
+            sizes["stale"] = stale_note.get_size()
+        rects = self.layout.place(self._weather_layout(len(forecast_rows), stale), sizes)
+        if stale:
+            self._to_draw.append(
+                (stale_note, rects["stale"], self._alpha("current_temp"))
             )
-            icon_rect.right = high_temp_rect.left - self._MARGIN_VALUE
 
-            self._to_draw.append((day, day_rect))
-            self._to_draw.append((date, date_rect))
-            self._to_draw.append((high_temp, high_temp_rect))
-            self._to_draw.append((icon, icon_rect))
+        forecast_alpha = self._alpha("forecast")
+        for x, (day, date, high_temp, icon) in enumerate(forecast_rows):
+            self._to_draw.append((day, rects[f"day{x}"], forecast_alpha))
+            self._to_draw.append((date, rects[f"date{x}"], forecast_alpha))
+            self._to_draw.append((high_temp, rects[f"high_temp{x}"], forecast_alpha))
+            self._to_draw.append((icon, rects[f"icon{x}"], forecast_alpha))
 
         # Add rects and images to _to_draw to blit to screen in main loop
-        self._to_draw.append((location, location_rect))
-        self._to_draw.append((current_icon, current_icon_rect))
-        self._to_draw.append((current_temp, current_temp_rect))
-        self._to_draw.append((daily_high, daily_high_rect))
-        self._to_draw.append((daily_low, daily_low_rect))
+        self._to_draw.append((location, rects["location"], self._alpha("location")))
+        self._to_draw.append(
+            (current_icon, rects["current_icon"], self._alpha("current_icon"))
+        )
+        self._to_draw.append(
+            (current_temp, rects["current_temp"], self._alpha("current_temp"))
+        )
+        self._to_draw.append(
+            (daily_high, rects["daily_high"], self._alpha("daily_temps"))
+        )
+        self._to_draw.append(
+            (daily_low, rects["daily_low"], self._alpha("daily_temps"))
+        )
 
     # -- Flask QR Code -- #
-    def _flask_qrcode(self):
-        if not os.path.join(os.path.dirname(__file__), "qr_test.png"):
-            url = f"http://{config('FLASK_IP')}:{config('FLASK_PORT')}"
-            qr_code = qrcode.QRCode(
-                version=1,
-                error_correction=qrcode.constants.ERROR_CORRECT_L,
-                box_size=10,
-                border=4,
-            )
-            qr_code.add_data(url)
-            qr_code.make(fit=True)
-            qr_raw_img = qr_code.make_image(fill_color="white", back_color="black")
-            qr_raw_img.save(os.path.join(os.path.dirname(__file__), "qr_test.png"))
-        qr_img = self.smart_mirror.import_image(
-            os.path.join(os.path.dirname(__file__), "qr_test.png")
+    def _build_qrcode(self, url):
+        """Generate the QR code in memory
+
+        Args:
+            url (str): URL of the Flask app
+
+        Returns:
+            Surface: Pygame surface of the QR code
+        """
+        qr_code = qrcode.QRCode(
+            version=1,
+            error_correction=qrcode.constants.ERROR_CORRECT_L,
+            box_size=10,
+            border=4,
         )
-        qr_img_rect = qr_img.get_rect()
-        qr_img.set_alpha(150)
-        qr_img_rect.bottomright = self.smart_mirror.screen_rect.bottomright
+        qr_code.add_data(url)
+        qr_code.make(fit=True)
+        qr_raw_img = qr_code.make_image(fill_color="white", back_color="black")
+        qr_buffer = io.BytesIO()
+        qr_raw_img.save(qr_buffer)
+        qr_buffer.seek(0)
+        qr_img = pygame.image.load(qr_buffer, "qrcode.png")
+        return pygame.transform.scale(qr_img, (self._QRCODE_SIZE, self._QRCODE_SIZE))
 
-        self._to_draw.append((qr_img, qr_img_rect))
+    def _static_widgets(self, flask_ip, flask_port):
+        """Widgets drawn into the static layer"""
+        qr_img = self._build_qrcode(f"http://{flask_ip}:{flask_port}")
+        rects = self.layout.place("qrcode", {"qr_img": qr_img.get_size()})
+        return [(qr_img, rects["qr_img"], self._QRCODE_ALPHA)]
+
+    def _static_layer(self):
+        """Static widgets, rebuilt only when the Flask address or the screen
+        size changes
+        """
+        flask_ip = config("FLASK_IP")
+        flask_port = config("FLASK_PORT")
+        key = (
+            flask_ip,
+            flask_port,
+            self.smart_mirror.screen_rect.size,
+            self._ANCHORS["qrcode"],
+        )
+        layer, layer_rect = self.static_layer.get(
+            key, lambda: self._static_widgets(flask_ip, flask_port)
+        )
+        self._to_draw.append((layer, layer_rect, self._MAX_ALPHA))
 
     # --PyGame functions -- #
     def create_and_place(self):
         self._to_draw = []
-        self._update_alpha_values()
-        self._face_rec_name()
-        self._date_and_time()
-        self._weather_and_location()
-        self._flask_qrcode()
+        frame_stats = self.smart_mirror.frame_stats
+        for name, widget_func in self._widget_funcs:
+            with frame_stats.time(name):
+                widget_func()
+        self.fonts.end_frame()
 
     def screen_objects(self):
+        """Returns:
+            [(Surface, Rect, int),]: Surfaces, where to draw them and the
+            alpha to composite them with
+        """
         return self._to_draw